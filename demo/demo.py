@@ -142,11 +142,11 @@ class Demo(object):
 	def show_log(self):
 		"""Show log window"""
 		logger.error('just test error message, the long string will be truncated truncated truncated truncated truncated truncated truncated truncated')
-		self.screen.show(self.s_log_window)
+		self.screen.show(self.s_log_window, save_under = True)
 
 	def show_plot(self):
 		"""Show plot window"""
-		self.screen.show(self.s_plot_window)
+		self.screen.show(self.s_plot_window, save_under = True)
 
 	def idle_timer(self):
 		logger.debug('idle_timer')
@@ -171,7 +171,7 @@ class Demo(object):
 		utils.add_top_left(self.s_action, self.s_progress, xmargin = progress_margin, ymargin = progress_margin)
 		self.s_remaining = label.TextLabel(w - progress_margin - progress_sz - self.style.close_btn_sz, h, Style(tag='remaining'))
 		utils.add_top_left(self.s_action, self.s_remaining, next_to = self.s_progress)
-		self.screen.show(self.s_action)
+		self.screen.show(self.s_action, save_under = True)
 
 	def x_show_activity_screen(self):
 		"""Show activity screen from worker thread"""
@@ -188,7 +188,7 @@ class Demo(object):
 
 	def x_show_progress(self, val, rotating, secs_left = None):
 		"""Show progress from worker thread"""
-		app.instance.add_job(functools.partial(self.show_progress, val, rotating, secs_left))
+		app.instance.add_job(functools.partial(self.show_progress, val, rotating, secs_left), 'progress')
 
 	def close_activity_screen(self):
 		"""Close activity screen"""
@@ -250,7 +250,7 @@ class Demo(object):
 
 	def x_set_status(self, sta):
 		"""Set new status from worker thread"""
-		app.instance.add_job(functools.partial(self.set_status, sta))
+		app.instance.add_job(functools.partial(self.set_status, sta), 'status')
 
 	def show_info(self, text, lvl):
 		"""Show info on bottom panel"""
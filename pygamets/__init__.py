@@ -13,5 +13,13 @@ import list_view
 import log_view
 import plot
 import style
+import latency
+import damage
+import cache
+import spatial
+import fbdev
+import executor
+import profiler
+import remote
 import localize
 import utils
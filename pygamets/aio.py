@@ -0,0 +1,176 @@
+"""
+Asyncio event loop integration.
+
+The screen event loop may run as the sequence of steps scheduled
+on the asyncio event loop instead of owning the thread. In such mode
+the application timers are scheduled by means of the asyncio loop
+call_later and jobs added from foreign threads wake up the screen
+loop by means of call_soon_threadsafe. The code running in the event
+loop context may start coroutines doing input / output by means of
+spawn routine. Under python 2 the trollius package is used in place
+of asyncio.
+"""
+
+try:
+	import asyncio
+except ImportError:
+	import trollius as asyncio
+
+import pygame as pg
+import app
+
+def spawn(coro, loop = None):
+	"""Schedule coroutine execution on the event loop, returns the task object"""
+	ensure_future = getattr(asyncio, 'ensure_future', None) or getattr(asyncio, 'async')
+	return ensure_future(coro, loop = loop)
+
+class TimerQueue(object):
+	"""The timer queue scheduling timers on the asyncio event loop"""
+	def __init__(self, loop, wakeup = None):
+		self.loop = loop
+		self.wakeup = wakeup
+		self.handles = {}
+
+	def __len__(self):
+		return len(self.handles)
+
+	def push(self, timer, due):
+		"""Schedule timer at the given due time in pygame ticks"""
+		assert timer.queue is None
+		timer.due, timer.queue = due, self
+		delay = max(0, due - pg.time.get_ticks()) / 1000.
+		self.handles[timer] = self.loop.call_later(delay, self.fire, timer)
+
+	def remove(self, timer):
+		"""Remove timer from the queue"""
+		assert timer.queue is self
+		self.handles.pop(timer).cancel()
+		timer.queue = None
+
+	def next_deadline(self):
+		"""Returns the earliest due time or None if the queue is empty"""
+		if self.handles:
+			return min(t.due for t in self.handles)
+		return None
+
+	def pop_expired(self, now):
+		"""The timers are fired by the asyncio event loop so there is nothing to pop"""
+		return []
+
+	def process(self, now, deadline = None):
+		"""The timers are fired by the asyncio event loop"""
+		pass
+
+	def fire(self, timer):
+		"""Call expired timer callback rescheduling periodic one"""
+		del self.handles[timer]
+		timer.queue = None
+		if timer.cb:
+			timer.cb()
+		if timer.cb and timer.queue is None:
+			if timer.periodic:
+				if timer.precise:
+					next = timer.due + timer.interval
+				else:
+					next = pg.time.get_ticks() + timer.interval
+				self.push(timer, next)
+			else:
+				timer.cb = None
+		if self.wakeup is not None:
+			self.wakeup()
+
+class ScreenRunner(object):
+	"""
+	Runs screen event loop on the asyncio event loop. The loop iteration is executed
+	upon wakeup (timer expiration, job submission or touch screen input if it is read
+	by the separate thread) or periodically to poll pygame events at max_fps rate
+	or every Application.poll_interval msec if max_fps is 0.
+	"""
+	def __init__(self, screen, max_fps = 0, loop = None):
+		self.screen = screen
+		self.loop = loop if loop is not None else asyncio.get_event_loop()
+		self.max_fps = max_fps
+		self.future = None
+		self.handle = None
+		self.saved = None
+
+	def start(self):
+		"""Start running the screen event loop. Returns the future completed when the screen loop exits."""
+		assert self.future is None
+		inst = app.instance
+		self.saved = inst.timers, inst.wakeup_hook, inst.wakeup_on_job
+		timers = TimerQueue(self.loop, self.schedule_step)
+		for timer in inst.timers.pop_expired(float('inf')):
+			timers.push(timer, timer.due)
+		inst.timers = timers
+		inst.wakeup_hook = self.wakeup
+		inst.wakeup_on_job = True
+		self.future = asyncio.Future(loop = self.loop)
+		self.schedule_step()
+		return self.future
+
+	def stop(self, exc = None):
+		"""Stop running the screen event loop"""
+		if self.handle is not None:
+			self.handle.cancel()
+			self.handle = None
+		inst = app.instance
+		if inst is not None:
+			timers, inst.wakeup_hook, inst.wakeup_on_job = self.saved
+			for timer in list(inst.timers.handles):
+				inst.timers.remove(timer)
+				timers.push(timer, timer.due)
+			inst.timers = timers
+		if not self.future.done():
+			if exc is not None:
+				self.future.set_exception(exc)
+			else:
+				self.future.set_result(None)
+
+	def wakeup(self):
+		"""Schedule the loop iteration. May be called from any thread."""
+		self.loop.call_soon_threadsafe(self.schedule_step)
+
+	def schedule_step(self, delay = 0):
+		if self.future is None or self.future.done():
+			return
+		if self.handle is not None:
+			if delay:
+				return
+			self.handle.cancel()
+		if delay:
+			self.handle = self.loop.call_later(delay, self.step)
+		else:
+			self.handle = self.loop.call_soon(self.step)
+
+	def step(self):
+		"""Execute the screen event loop iteration"""
+		self.handle = None
+		try:
+			for e in pg.event.get():
+				self.screen.handle_event(e)
+				if e.type == pg.QUIT:
+					self.stop()
+					return
+			self.screen.refresh()
+		except Exception as e:
+			self.stop(e)
+			return
+		if self.screen.top_window() is None:
+			self.stop()
+			return
+		if self.max_fps:
+			interval = 1. / self.max_fps
+		else:
+			interval = app.instance.poll_interval / 1000.
+		self.schedule_step(interval)
+
+def run(screen, max_fps = 0, loop = None):
+	"""Start running screen event loop on the asyncio event loop, returns the future completed on exit"""
+	return ScreenRunner(screen, max_fps, loop).start()
+
+def run_event_loop(screen, max_fps = 0, loop = None):
+	"""Run asyncio event loop until the screen event loop exits"""
+	if loop is None:
+		loop = asyncio.get_event_loop()
+	return loop.run_until_complete(run(screen, max_fps, loop))
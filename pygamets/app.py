@@ -6,29 +6,50 @@ provides several useful capabilities:
   - asynchronous jobs called once in the context of the event loop
     (for foreign threads safe interfacing)
   - timers called in the context of the event loop
+  - functions executed in background threads with results
+    delivered to the event loop
 Note that all above facilities are available regardless of the
 particular event loop implementation. So this gives rather flexible
 approach to extending existing code capabilities.
 On win32 platform the code implements above facilities without
 patching pygame event path.
+The touch screen events may be read either by polling events
+file on every event loop iteration or by the separate thread
+waking up the event loop upon receiving new events.
+In headless mode the SDL dummy video driver is used and the
+touch screen is not read, the input may be injected instead
+or replayed from the events trace file (see events.replay).
 """
 
-import sys, os
+import sys, os, time
 import threading
+from collections import deque
 import pygame as pg
 
 patch_events = sys.platform != 'win32'
 if patch_events:
 	import events, calibration
+import executor
 
 # Application instance
 instance = None
 
-def init():
-	"""Create application instance singleton"""
+# The event type posted to wake up the event loop
+WAKEUP_EVENT = pg.NUMEVENTS - 1
+
+# The job queue overflow policies
+JOB_BLOCK       = 'block'
+JOB_DROP_OLDEST = 'drop_oldest'
+
+def init(input_thread = False, headless = False):
+	"""
+	Create application instance singleton.
+	If input_thread is True the touch screen events will be read by the separate thread.
+	If headless is True the display and touch screen are not used (see Application.inject_event).
+	"""
 	if instance is not None:
 		return instance
-	return Application()
+	return Application(input_thread, headless)
 
 def fini():
 	if instance:
@@ -41,53 +62,275 @@ class Timer(object):
 		self.interval = interval
 		self.periodic = periodic
 		self.precise = False
+		# The scheduling state maintained by the timer queue
+		self.due = None
+		self.seq = None
+		self.queue = None
+		self.index = None
 
 	def cancel(self):
 		"""Cancel timer so it wont be fired anymore"""
 		self.cb = None
+		if self.queue is not None:
+			self.queue.remove(self)
 
-class Application(object):
+class TimerQueue(object):
+	"""
+	The binary heap of timers ordered by the due time. The timers with
+	the same due time are ordered by the time of scheduling. Every timer
+	keeps its index in the heap so it may be removed in O(log n) time.
+	"""
+	def __init__(self):
+		self.heap = []
+		self.seq = 0
+
+	def __len__(self):
+		return len(self.heap)
+
+	def push(self, timer, due):
+		"""Schedule timer at the given due time"""
+		assert timer.queue is None
+		self.seq += 1
+		timer.due, timer.seq, timer.queue = due, self.seq, self
+		timer.index = len(self.heap)
+		self.heap.append(timer)
+		self._sift_up(timer.index)
+
+	def remove(self, timer):
+		"""Remove timer from the queue"""
+		assert timer.queue is self
+		i, last = timer.index, self.heap.pop()
+		if last is not timer:
+			self.heap[i] = last
+			last.index = i
+			self._sift_down(i)
+			self._sift_up(last.index)
+		timer.queue = timer.index = None
+
+	def next_deadline(self):
+		"""Returns the earliest due time or None if the queue is empty"""
+		if self.heap:
+			return self.heap[0].due
+		return None
+
+	def pop_expired(self, now):
+		"""Remove timers with due time not later than now and return them in the order of expiration"""
+		expired, heap = [], self.heap
+		while heap and heap[0].due <= now:
+			timer = heap[0]
+			self.remove(timer)
+			expired.append(timer)
+		return expired
+
+	def process(self, now, deadline = None):
+		"""
+		Call expired timers callbacks rescheduling periodic ones.
+		If the deadline is given the processing stops after reaching it
+		leaving the rest of expired timers for the next call. At least
+		one timer is processed anyway.
+		"""
+		expired = self.pop_expired(now)
+		for i, timer in enumerate(expired):
+			if deadline is not None and i and pg.time.get_ticks() >= deadline:
+				for t in expired[i:]:
+					if t.cb and t.queue is None:
+						self.push(t, t.due)
+				break
+			if timer.cb:
+				timer.cb()
+			if timer.cb and timer.queue is None:
+				if timer.periodic:
+					if timer.precise:
+						next = timer.due + timer.interval
+					else:
+						next = now + timer.interval
+					self.push(timer, next)
+				else:
+					timer.cb = None
 
+	def _sift_up(self, i):
+		heap, timer = self.heap, self.heap[i]
+		key = timer.due, timer.seq
+		while i > 0:
+			p = (i - 1) >> 1
+			parent = heap[p]
+			if key >= (parent.due, parent.seq):
+				break
+			heap[i] = parent
+			parent.index = i
+			i = p
+		heap[i] = timer
+		timer.index = i
+
+	def _sift_down(self, i):
+		heap, n, timer = self.heap, len(self.heap), self.heap[i]
+		key = timer.due, timer.seq
+		while True:
+			c = 2*i + 1
+			if c >= n:
+				break
+			child = heap[c]
+			if c + 1 < n:
+				right = heap[c + 1]
+				if (right.due, right.seq) < (child.due, child.seq):
+					c, child = c + 1, right
+			if key <= (child.due, child.seq):
+				break
+			heap[i] = child
+			child.index = i
+			i = c
+		heap[i] = timer
+		timer.index = i
+
+class AnimationClock(object):
+	"""
+	The clock shared by animated views. The views subscribe periodic timers
+	to the clock instead of adding them to the application. The screen advances
+	the clock just before the display refresh so all animations being due are
+	drawn in one batch and updated by the single display update.
+	"""
 	def __init__(self):
+		self.timers = TimerQueue()
+
+	def subscribe(self, timer):
+		"""Subscribe timer object. Use Timer.cancel to unsubscribe."""
+		self.timers.push(timer, pg.time.get_ticks() + timer.interval)
+
+	def next_deadline(self):
+		"""Returns the time in pygame ticks of the next subscriber expiration or None if there are no subscribers"""
+		return self.timers.next_deadline()
+
+	def advance(self):
+		"""Call subscribers being due"""
+		if self.timers:
+			self.timers.process(pg.time.get_ticks())
+
+class Application(object):
+
+	def __init__(self, input_thread = False, headless = False):
 		global instance
 		assert instance is None
-		self.pygame_init()
+		self.headless = headless
+		# Read touch screen events in place of pygame mouse events
+		self.patch_events = patch_events and not headless
+		self.input_reader = None
+		self.wakeup_pending = False
+		# Post wakeup event on adding jobs (enabled by the first wait_events call)
+		self.wakeup_on_job = False
+		# The routine called in place of posting wakeup event if set
+		self.wakeup_hook = None
+		# The events received while waiting
+		self.pending_events = []
+		# Events file polling interval in msec while waiting for events
+		self.poll_interval = 20
+		# The time in msec per event loop iteration available for jobs and timers
+		# processing. The work left is carried over to the next iteration.
+		# The None value means no limit. If set the work is run after the
+		# events handling (see run_budgeted_work).
+		self.frame_budget = None
+		# Merge subsequent touch motion samples into the single MOUSEMOTION event
+		# and update mouse cursor position once per events batch
+		self.coalesce_motion = False
+		# The chain of raw input filters (see filters.py)
+		self.input_filters = []
+		self.pygame_init(input_thread)
 		self.event_loop_callbacks = []
 		self.job_lock = threading.Lock()
-		self.job_list = []
-		self.timers = []
+		self.job_cond = threading.Condition(self.job_lock)
+		# The queue of [key, job] entries and the map of the keyed entries
+		self.job_list = deque()
+		self.job_keys = {}
+		self.job_count = 0
+		self.job_limit = None
+		self.job_policy = JOB_BLOCK
+		self.jobs_dropped = 0
+		self.jobs_coalesced = 0
+		self.thread = threading.current_thread()
+		# Background execution facilities
+		self.pool_threads = 2
+		self.thread_pool = None
+		self.executor = None
+		self.timers = TimerQueue()
+		self.animation = AnimationClock()
 		instance = self
 
-	def pygame_init(self):
+	def pygame_init(self, input_thread = False):
 		"""Proper initialize pygame module"""
+		if self.headless:
+			os.environ['SDL_VIDEODRIVER'] = 'dummy'
 		# stop reading events by pygame engine to avoid erratic mouse pointer behaviour
-		if patch_events:
+		if self.patch_events:
 			os.putenv('SDL_MOUSEDEV', '/dev/null')
 		pg.init()
-		if patch_events:
-			pg.event.set_blocked((pg.MOUSEBUTTONDOWN, pg.MOUSEBUTTONUP, pg.MOUSEMOTION))
-			self.calib = calibration.load()
+		if self.patch_events or (self.headless and patch_events):
+			if self.patch_events:
+				pg.event.set_blocked((pg.MOUSEBUTTONDOWN, pg.MOUSEBUTTONUP, pg.MOUSEMOTION))
+				self.calib = calibration.load()
+			else:
+				# The raw events may be replayed in headless mode (see events.replay)
+				# so use calibration if available, the raw coordinates otherwise
+				try:
+					self.calib = calibration.load()
+				except ImportError:
+					self.calib = None
 			inf = pg.display.Info()
-			self.screen_w = inf.current_w
-			self.screen_h = inf.current_h
+			self.set_screen_size(inf.current_w, inf.current_h)
 			self.mouse_pos = None
 			self.mouse_down = False
 			self._down = None
+			if input_thread and self.patch_events:
+				self.input_reader = events.EventsReader(self.wakeup)
+				self.input_reader.start()
 		# install event filter
 		self.pygame_get_events = pg.event.get
+		self.pygame_wait_event = pg.event.wait
 		pg.event.get = self.get_events
 
+	def set_screen_size(self, w, h):
+		"""Set the screen size the touch screen coordinates are mapped to"""
+		self.screen_w, self.screen_h = w, h
+		if not patch_events:
+			# The touch screen events are never read
+			return
+		if self.calib is not None:
+			self.calib_map = calibration.ScreenMapper(self.calib, (w, h))
+		else:
+			self.calib_map = calibration.IdentityMapper()
+
+	def replaying(self):
+		"""Returns True if the events trace is replayed in headless mode"""
+		return self.headless and patch_events and isinstance(events.events_file, events.TraceReplay)
+
 	def fini(self):
 		"""Deinitialize pygame module"""
 		global instance
 		assert instance is not None
 		assert self.pygame_get_events is not None
 		instance = None
+		if self.input_reader is not None:
+			# Stop before pg.quit so the reader never posts wakeup events after it
+			self.input_reader.stop()
+			self.input_reader = None
+		if self.thread_pool is not None:
+			self.thread_pool.shutdown(False)
+			self.thread_pool = None
 		pg.quit()
 		# remove event filter
 		pg.event.get = self.pygame_get_events
 		self.pygame_get_events = None
 
+	def wakeup(self):
+		"""Wake up the event loop waiting for events. May be called from any thread."""
+		if self.wakeup_hook is not None:
+			self.wakeup_hook()
+		elif not self.wakeup_pending:
+			self.wakeup_pending = True
+			pg.event.post(pg.event.Event(WAKEUP_EVENT))
+
+	def add_input_filter(self, f):
+		"""Append filter stage to the raw input filters chain"""
+		self.input_filters.append(f)
+
 	def add_event_loop_callback(self, cb):
 		"""Add callback to be called in event loop context"""
 		self.event_loop_callbacks.append(cb)
@@ -97,84 +340,292 @@ class Application(object):
 		for cb in self.event_loop_callbacks:
 			cb()
 
-	def add_job(self, job):
-		"""Add job to be called once in event loop context"""
+	def set_job_limit(self, limit, policy = JOB_BLOCK):
+		"""
+		Limit the number of queued jobs. On overflow the foreign thread adding job is either
+		blocked until the event loop runs jobs (JOB_BLOCK) or the oldest job is dropped
+		(JOB_DROP_OLDEST). The jobs added in the event loop context are never blocked.
+		The None limit means unlimited queue.
+		"""
+		assert policy in (JOB_BLOCK, JOB_DROP_OLDEST)
 		with self.job_lock:
-			self.job_list.append(job)
+			self.job_limit = limit
+			self.job_policy = policy
+			self.job_cond.notify_all()
 
-	def run_jobs(self):
-		"""Execute registered jobs"""
+	def add_job(self, job, key = None):
+		"""
+		Add job to be called once in event loop context.
+		If the key is not None the job supersedes the job with the same key
+		still waiting in the queue so only the newest one will be called.
+		"""
 		with self.job_lock:
-			self.job_list, job_list = [], self.job_list
-		for job in job_list:
-			job()
+			if key is not None:
+				self._supersede_job(key)
+			limit = self.job_limit
+			if limit is not None and self.job_count >= limit:
+				if self.job_policy == JOB_DROP_OLDEST:
+					while self.job_count >= limit:
+						self._drop_job()
+				elif threading.current_thread() is not self.thread:
+					while self.job_limit is not None and self.job_count >= self.job_limit:
+						self.job_cond.wait()
+					if key is not None:
+						# The job with the same key may be added while waiting
+						self._supersede_job(key)
+			entry = [key, job]
+			self.job_list.append(entry)
+			self.job_count += 1
+			if key is not None:
+				self.job_keys[key] = entry
+		if self.wakeup_on_job:
+			self.wakeup()
+
+	def _supersede_job(self, key):
+		"""Remove the queued job with the given key if any. Must be called with job_lock held."""
+		entry = self.job_keys.pop(key, None)
+		if entry is not None:
+			# Leave the superseded entry in the queue as a placeholder
+			entry[1] = None
+			self.job_count -= 1
+			self.jobs_coalesced += 1
+
+	def _drop_job(self):
+		"""Drop the oldest job. Must be called with job_lock held."""
+		while True:
+			key, job = self.job_list.popleft()
+			if job is not None:
+				break
+		if key is not None:
+			del self.job_keys[key]
+		self.job_count -= 1
+		self.jobs_dropped += 1
+
+	def job_queue_depth(self):
+		"""Returns the number of queued jobs"""
+		return self.job_count
+
+	def job_queue_stats(self):
+		"""Returns the dictionary with queue depth, dropped and coalesced jobs counters"""
+		with self.job_lock:
+			return {
+				'depth'     : self.job_count,
+				'dropped'   : self.jobs_dropped,
+				'coalesced' : self.jobs_coalesced,
+			}
+
+	def run_jobs(self, deadline = None):
+		"""
+		Execute registered jobs. If the deadline (in pygame ticks) is given
+		the execution stops after reaching it leaving the rest of jobs for
+		the next call. At least one job is executed anyway.
+		"""
+		with self.job_lock:
+			self.job_list, job_list = deque(), self.job_list
+			self.job_keys = {}
+			self.job_count = 0
+			self.job_cond.notify_all()
+		executed = False
+		while job_list:
+			if deadline is not None and executed and pg.time.get_ticks() >= deadline:
+				self._requeue_jobs(job_list)
+				break
+			_, job = job_list.popleft()
+			if job is not None:
+				job()
+				executed = True
+
+	def _requeue_jobs(self, job_list):
+		"""Put jobs left unexecuted back to the head of the queue"""
+		with self.job_lock:
+			for entry in job_list:
+				key, job = entry
+				if job is None:
+					continue
+				if key is not None:
+					if key in self.job_keys:
+						# superseded by the job added in the meantime
+						entry[1] = None
+						self.jobs_coalesced += 1
+						continue
+					self.job_keys[key] = entry
+				self.job_count += 1
+			job_list.extend(self.job_list)
+			self.job_list = job_list
+
+	def set_executor(self, executor):
+		"""
+		Set the executor used by submit in place of the built-in thread pool.
+		It may be any object with concurrent.futures.Executor compatible submit
+		method, for example ProcessPoolExecutor. The None restores the default.
+		"""
+		self.executor = executor
+
+	def submit(self, fn, *args, **kwargs):
+		"""
+		Call function in background thread. Returns executor.Future object.
+		The future completion callbacks are called in the event loop context.
+		"""
+		if self.executor is not None:
+			f = executor.Future(self.add_job)
+			self.executor.submit(fn, *args, **kwargs).add_done_callback(f.set_from)
+			return f
+		if self.thread_pool is None:
+			self.thread_pool = executor.ThreadPool(self.pool_threads, self.add_job)
+		return self.thread_pool.submit(fn, *args, **kwargs)
+
+	def call_soon_threadsafe(self, fn, *args, **kwargs):
+		"""
+		Call function in the event loop context. May be called from any thread.
+		Returns executor.Future object with the function result.
+		"""
+		f = executor.Future(self.add_job)
+		self.add_job(lambda: executor.run(f, fn, args, kwargs))
+		return f
 
 	def add_timer(self, timer):
 		"""Add timer object"""
 		now = pg.time.get_ticks()
-		self.timers.append((now + timer.interval, timer))
-		self.timers.sort()
+		self.timers.push(timer, now + timer.interval)
 
-	def process_timers(self):
-		"""Process registered timers"""
-		now = pg.time.get_ticks()
-		not_expired = len(self.timers)
-		for i, (t, _) in enumerate(self.timers):
-			if t > now:
-				not_expired = i
-				break
-		if not not_expired:
-			return
-		expired, self.timers = self.timers[:not_expired], self.timers[not_expired:]
-		rescheduled = False
-		for due, timer in expired:
-			if timer.cb:
-				timer.cb()
-			if timer.cb:
-				if timer.periodic:
-					if timer.precise:
-						next = due + timer.interval
-					else:
-						next = now + timer.interval
-					self.timers.append((next, timer))
-					rescheduled = True
-				else:
-					timer.cb = None
-		if rescheduled:
-			self.timers.sort()
+	def next_deadline(self):
+		"""
+		Returns the time in pygame ticks of the next timer or animation clock
+		subscriber expiration or None if there are no timers
+		"""
+		deadlines = [t for t in (self.timers.next_deadline(), self.animation.next_deadline()) if t is not None]
+		return min(deadlines) if deadlines else None
+
+	def process_timers(self, deadline = None):
+		"""Process registered timers optionally stopping after reaching deadline in pygame ticks"""
+		self.timers.process(pg.time.get_ticks(), deadline)
 
 	def read_events(self):
-		evs, sys_evs = [], events.read_events()
-		for e in sys_evs:
+		if self.input_reader is not None:
+			sys_evs = self.input_reader.read_events()
+		else:
+			sys_evs = events.read_events()
+		if self.input_filters:
+			for f in self.input_filters:
+				sys_evs = f(sys_evs)
+			sys_evs = list(sys_evs)
+		evs, coalesce, last = [], self.coalesce_motion, len(sys_evs) - 1
+		moved = False
+		for i, e in enumerate(sys_evs):
 			if e.down is not None:
 				self._down = e.down	
 				if not self._down and self.mouse_down and self.mouse_pos:
-					evs.append(pg.event.Event(pg.MOUSEBUTTONUP, button=1, pos=self.mouse_pos))
+					evs.append(pg.event.Event(pg.MOUSEBUTTONUP, button=1, pos=self.mouse_pos, ts=e.ts))
 					self.mouse_down = False
 			if e.pos is not None:
-				screen_pos = calibration.to_screen(e.pos, (self.screen_w, self.screen_h), self.calib)
+				if coalesce and i < last and sys_evs[i+1].pos is not None and (self.mouse_down or not self._down):
+					# The position is going to be overwritten by the next sample
+					# without generating button events, so the motion will be
+					# reported once relative to the last reported position
+					continue
+				screen_pos = self.calib_map.to_screen(e.pos)
 				if self._down:
 					if not self.mouse_down:
-						evs.append(pg.event.Event(pg.MOUSEBUTTONDOWN, button=1, pos=screen_pos))
+						evs.append(pg.event.Event(pg.MOUSEBUTTONDOWN, button=1, pos=screen_pos, ts=e.ts))
 						self.mouse_down = True
 					elif self.mouse_pos and self.mouse_pos != screen_pos:
 						evs.append(pg.event.Event(
-							pg.MOUSEMOTION, buttons=(1, 0, 0), pos=screen_pos, rel=(screen_pos[0]-self.mouse_pos[0], screen_pos[1]-self.mouse_pos[1])
+							pg.MOUSEMOTION, buttons=(1, 0, 0), pos=screen_pos, rel=(screen_pos[0]-self.mouse_pos[0], screen_pos[1]-self.mouse_pos[1]), ts=e.ts
 						))
 				self.mouse_pos = screen_pos
-				pg.mouse.set_pos(*screen_pos)
+				if coalesce:
+					moved = True
+				else:
+					pg.mouse.set_pos(*screen_pos)
+
+		if moved:
+			pg.mouse.set_pos(*self.mouse_pos)
 
 		return evs
 
+	def inject_event(self, type, **attrs):
+		"""
+		Inject synthetic input event to be returned by the next get_events call.
+		The event time stamp is set to the current time unless given explicitly.
+		"""
+		attrs.setdefault('ts', time.time())
+		self.pending_events.append(pg.event.Event(type, attrs))
+
+	def inject_tap(self, pos):
+		"""Inject touch screen tap at the given screen position"""
+		self.inject_event(pg.MOUSEBUTTONDOWN, button=1, pos=pos)
+		self.inject_event(pg.MOUSEBUTTONUP, button=1, pos=pos)
+
+	def next_filter_release(self):
+		"""Returns the earliest time the input filters release the event held or None"""
+		times = [t for t in (f.next_release() for f in self.input_filters) if t is not None]
+		return min(times) if times else None
+
+	def wait_events(self, max_wait = None):
+		"""
+		Block until the next timer expiration, job submission, input or any other pygame event
+		or until max_wait msec passed. Returns immediately if there is something to do already.
+		The events received while waiting are returned by the subsequent get_events call.
+		Note that the touch screen events file is polled every poll_interval msec
+		unless it is read by the separate thread. The wait is limited by the release
+		time of the events held by the input filters as well.
+		"""
+		self.wakeup_on_job = True
+		if self.job_count or self.pending_events:
+			return
+		timeout = max_wait
+		deadline = self.next_deadline()
+		if deadline is not None:
+			t = deadline - pg.time.get_ticks()
+			if t <= 0:
+				return
+			timeout = t if timeout is None else min(timeout, t)
+		if (self.patch_events or self.replaying()) and self.input_reader is None:
+			timeout = self.poll_interval if timeout is None else min(timeout, self.poll_interval)
+		release = self.next_filter_release()
+		if release is not None:
+			t = int((release - time.time()) * 1000) + 1
+			if t <= 0:
+				return
+			timeout = t if timeout is None else min(timeout, t)
+		if timeout is not None:
+			pg.time.set_timer(WAKEUP_EVENT, max(1, timeout))
+		e = self.pygame_wait_event()
+		if timeout is not None:
+			pg.time.set_timer(WAKEUP_EVENT, 0)
+		if e.type == WAKEUP_EVENT:
+			self.wakeup_pending = False
+		elif e.type != pg.NOEVENT:
+			self.pending_events.append(e)
+
 	def get_events(self):
 		"""Query events filter. This is the replacement for the pygame.event.get"""
-		self.run_callbacks()
-		self.run_jobs()
-		self.process_timers()
+		if self.frame_budget is None:
+			self.run_callbacks()
+			self.run_jobs()
+			self.process_timers()
 
-		evs = self.pygame_get_events()
+		self.wakeup_pending = False
+		evs = [e for e in self.pygame_get_events() if e.type != WAKEUP_EVENT]
+		if self.pending_events:
+			evs = self.pending_events + evs
+			self.pending_events = []
 
-		if patch_events:
+		if self.patch_events or self.replaying():
 			evs += self.read_events()
 
 		return evs
+
+	def run_budgeted_work(self):
+		"""
+		Run callbacks, jobs and timers limited by the frame_budget if it is set.
+		It is called by the Screen.refresh after the events are handled so
+		the input is not delayed by the background work. The event loops not
+		using the Screen.refresh should call it once per iteration.
+		"""
+		if self.frame_budget is None:
+			return
+		deadline = pg.time.get_ticks() + self.frame_budget
+		self.run_callbacks()
+		self.run_jobs(deadline)
+		self.process_timers(deadline)
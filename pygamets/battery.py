@@ -14,6 +14,8 @@ class BatteryIndicator(gui.View):
 	def __init__(self, w, h, st = None):
 		gui.View.__init__(self, w, h)
 		self.style = style.bind(self, st)
+		# the rounded corners show the parent background
+		self.opaque = False
 		self.charge = 0
 		self.font = None
 		self.text = None
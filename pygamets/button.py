@@ -67,6 +67,7 @@ class TextButton(Button):
 
 	def __init__(self, w, h, st = None):
 		Button.__init__(self, w, h, st)
+		self.opaque = False
 
 	def init(self, surface):
 		Button.init(self, surface)
@@ -86,6 +87,7 @@ class XButton(Button):
 
 	def __init__(self, w, st = None):
 		Button.__init__(self, w, w, st)
+		self.opaque = False
 
 	def draw(self):
 		color = self.style.x_color if not self.is_pressed else self.style.xp_color
@@ -99,6 +101,7 @@ class PulseTextButton(Button):
 
 	def __init__(self, w, h, st = None):
 		Button.__init__(self, w, h, st)
+		self.opaque = False
 
 	def init(self, surface):
 		Button.init(self, surface)
@@ -106,7 +109,7 @@ class PulseTextButton(Button):
 		self.font = pg.font.SysFont(self.style.font_face, self.style.font_size)
 		self.p_label = self.font.render(name, True, self.style.tp_color)
 		self.timer = app.Timer(self.on_timer, self.style.interval, True)
-		app.instance.add_timer(self.timer)
+		app.instance.animation.subscribe(self.timer)
 		self.labels = [None]*self.style.period
 		self.phase = 0
 
@@ -0,0 +1,86 @@
+"""
+Rendered views surface cache.
+
+The view may opt in for keeping its rendered image (including children) in the
+separate display format surface. The cached image is blitted instead of drawing
+until the view or one of its descendants is updated. The ancestor update drops
+the image only if the view is not opaque (see View.invalidate_cache). The memory
+occupied by all cached surfaces is limited by the global budget, the least
+recently used surfaces are evicted first.
+"""
+
+from collections import OrderedDict
+
+class SurfaceCache(object):
+	"""The LRU cache of view surfaces with memory budget given in bytes"""
+	def __init__(self, budget = 4 << 20):
+		self.budget = budget
+		self.surfaces = OrderedDict()
+		self.size = 0
+		self.hits = self.misses = self.evicted = 0
+
+	def __len__(self):
+		return len(self.surfaces)
+
+	def __contains__(self, v):
+		return v in self.surfaces
+
+	@staticmethod
+	def surface_size(surf):
+		w, h = surf.get_size()
+		return w * h * surf.get_bytesize()
+
+	def get(self, v):
+		"""Returns cached surface of the view or None"""
+		surf = self.surfaces.pop(v, None)
+		if surf is None:
+			self.misses += 1
+			return None
+		self.surfaces[v] = surf
+		self.hits += 1
+		return surf
+
+	def put(self, v, surf):
+		"""Put surface to the cache evicting least recently used ones if necessary"""
+		self.discard(v)
+		sz = self.surface_size(surf)
+		if sz > self.budget:
+			return
+		while self.size + sz > self.budget:
+			_, old = self.surfaces.popitem(last = False)
+			self.size -= self.surface_size(old)
+			self.evicted += 1
+		self.surfaces[v] = surf
+		self.size += sz
+
+	def discard(self, v):
+		"""Remove view surface from the cache"""
+		surf = self.surfaces.pop(v, None)
+		if surf is not None:
+			self.size -= self.surface_size(surf)
+
+	def set_budget(self, budget):
+		"""Change memory budget evicting surfaces if necessary"""
+		self.budget = budget
+		while self.size > budget:
+			_, old = self.surfaces.popitem(last = False)
+			self.size -= self.surface_size(old)
+			self.evicted += 1
+
+	def clear(self):
+		self.surfaces.clear()
+		self.size = 0
+
+	def stats(self):
+		"""Returns cache statistics dictionary"""
+		return {
+			'surfaces': len(self.surfaces), 'size': self.size, 'budget': self.budget,
+			'hits': self.hits, 'misses': self.misses, 'evicted': self.evicted
+		}
+
+# The global cache instance
+instance = SurfaceCache()
+
+def set_budget(budget):
+	"""Set global cache memory budget in bytes"""
+	instance.set_budget(budget)
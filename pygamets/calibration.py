@@ -1,5 +1,11 @@
 """
-Touch screen calibration management code
+Touch screen calibration management code.
+The calibration maps raw touch screen coordinates x, y to the relative
+screen coordinate (in 0..1 range) by means of the affine transform
+	f = ax + by + c
+optionally extended by the bilinear term
+	f = ax + by + c + dxy
+for better accuracy near the screen edges.
 """
 
 import os, math, imp
@@ -51,23 +57,56 @@ def lsm_solve(F, X, Y):
 	)
 	return da/d, db/d, dc/d
 
-def build(screen_pts, touch_pts):
+def lsm_solve_bilinear(F, X, Y):
+	"""
+	Find and return a, b, c, d giving lowest mean square error in the equation:
+		f = ax + by + c + dxy
+	The arguments F, X, Y are the lists of f, x, y.
+	"""
+	n = len(F)
+	assert n == len(X) == len(Y)
+	rows = [(float(x), float(Y[i]), 1., float(x)*Y[i]) for i, x in enumerate(X)]
+	# Build normal equations matrix augmented by the right side column
+	m = [[sum(r[j]*r[k] for r in rows) for k in range(4)] + [sum(r[j]*F[i] for i, r in enumerate(rows))] for j in range(4)]
+	# Solve by Gauss elimination with partial pivoting
+	for j in range(4):
+		p = max(range(j, 4), key = lambda i: abs(m[i][j]))
+		m[j], m[p] = m[p], m[j]
+		for i in range(j + 1, 4):
+			k = m[i][j] / m[j][j]
+			m[i] = [v - k*m[j][c] for c, v in enumerate(m[i])]
+	res = [0.] * 4
+	for j in reversed(range(4)):
+		res[j] = (m[j][4] - sum(m[j][k]*res[k] for k in range(j + 1, 4))) / m[j][j]
+	return tuple(res)
+
+def transform((x, y), coeffs):
+	"""Apply transform with given coefficients to the touch screen point"""
+	if len(coeffs) > 3:
+		a, b, c, d = coeffs
+		return a*x + b*y + c + d*x*y
+	a, b, c = coeffs
+	return a*x + b*y + c
+
+def build(screen_pts, touch_pts, bilinear = False):
 	"""
 	Returns the (calibration, maximum deviation) tuple
 	given the list of relative screen coordinates (in 0..1 range)
 	and the list of the corresponding touch points.
+	The bilinear calibration requires at least 4 points though
+	it makes sense to have more points near the screen edges.
 	"""
 	screen_x, screen_y = zip(*screen_pts)
 	touch_x,  touch_y  = zip(*touch_pts)
-	ax, bx, cx = lsm_solve(screen_x, touch_x, touch_y)
-	ay, by, cy = lsm_solve(screen_y, touch_x, touch_y)
+	solve = lsm_solve_bilinear if bilinear else lsm_solve
+	calib = solve(screen_x, touch_x, touch_y), solve(screen_y, touch_x, touch_y)
 	dmax = 0
-	for i, (tx, ty) in enumerate(touch_pts):
+	for i, pt in enumerate(touch_pts):
 		x, y = screen_pts[i]
-		dx, dy = ax*tx + bx*ty + cx - x, ay*tx + by*ty + cy - y
+		dx, dy = transform(pt, calib[0]) - x, transform(pt, calib[1]) - y
 		d = math.sqrt(dx*dx + dy*dy)
 		dmax = max(dmax, d)
-	return ((ax, bx, cx), (ay, by, cy)), dmax
+	return calib, dmax
 
 def config_dir():
 	"""Returns the path to config directory with calibration file"""
@@ -79,7 +118,7 @@ def config_path():
 
 def save(calib):
 	"""Save calibration coefficients"""
-	(ax, bx, cx), (ay, by, cy) = calib
+	cx, cy = calib
 	try:
 		# ensure the config directory exists
 		os.mkdir(config_dir())
@@ -87,7 +126,7 @@ def save(calib):
 		pass
 	with open(config_path(), 'w') as f:
 		f.write('# Autogenerated touch-screen calibration coefficients\n')
-		f.write('calib=((%f, %f, %f), (%f, %f, %f))\n' % (ax, bx, cx, ay, by, cy))
+		f.write('calib=((%s), (%s))\n' % (', '.join('%.10g' % c for c in cx), ', '.join('%.10g' % c for c in cy)))
 
 def load():
 	"""Load calibration coefficients"""
@@ -97,10 +136,62 @@ def load():
 
 def to_screen_rel((x, y), calib):
 	"""Convert touch screen point (x, y) to relative screen coordinate (in 0..1 range)"""
-	(ax, bx, cx), (ay, by, cy) = calib
-	return max(0., min(1., x*ax + y*bx + cx)), max(0., min(1., x*ay + y*by + cy))
+	cx, cy = calib
+	return max(0., min(1., transform((x, y), cx))), max(0., min(1., transform((x, y), cy)))
 
 def to_screen((x, y), (w, h), calib):
 	"""Convert touch screen point (x, y) to screen coordinate given the screen width, height tuple and calibration"""
 	rx, ry = to_screen_rel((x, y), calib)
 	return min(w, int(w*rx)), min(h, int(h*ry))
+
+class ScreenMapper(object):
+	"""
+	Converts touch screen points to screen coordinates by means of the integer
+	lookup tables precomputed over the raw touch screen coordinates range.
+	The points outside of that range are converted by to_screen routine.
+	"""
+	# Fixed point fraction bits
+	SHIFT = 16
+	# Extra fraction bits for the bilinear term
+	XY_SHIFT = 12
+
+	def __init__(self, calib, (w, h), raw_range = (4096, 4096)):
+		self.calib = calib
+		self.w, self.h = w, h
+		self.raw_w, self.raw_h = raw_range
+		self.xx, self.xy, self.xxy = self.build_tables(calib[0], w)
+		self.yx, self.yy, self.yxy = self.build_tables(calib[1], h)
+
+	def build_tables(self, coeffs, scale):
+		"""
+		Returns the tables tx, ty, txy so that the screen coordinate of the point x, y is
+		(tx[x] + ty[y] + (txy[x] * y >> XY_SHIFT)) >> SHIFT
+		The txy is None for affine calibration.
+		"""
+		a, b, c = coeffs[:3]
+		k = scale * float(1 << self.SHIFT)
+		tx = [int(math.floor(.5 + (a*x + c)*k)) for x in range(self.raw_w)]
+		ty = [int(math.floor(.5 + b*y*k)) for y in range(self.raw_h)]
+		txy = None
+		if len(coeffs) > 3 and coeffs[3]:
+			d = coeffs[3] * k * (1 << self.XY_SHIFT)
+			txy = [int(math.floor(.5 + d*x)) for x in range(self.raw_w)]
+		return tx, ty, txy
+
+	def to_screen(self, (x, y)):
+		"""Convert touch screen point (x, y) to screen coordinate"""
+		if not (0 <= x < self.raw_w and 0 <= y < self.raw_h):
+			return to_screen((x, y), (self.w, self.h), self.calib)
+		sx, sy = self.xx[x] + self.xy[y], self.yx[x] + self.yy[y]
+		if self.xxy is not None:
+			sx += self.xxy[x] * y >> self.XY_SHIFT
+		if self.yxy is not None:
+			sy += self.yxy[x] * y >> self.XY_SHIFT
+		sx >>= self.SHIFT
+		sy >>= self.SHIFT
+		return max(0, min(self.w, sx)), max(0, min(self.h, sy))
+
+class IdentityMapper(object):
+	"""Maps touch screen points to the same screen coordinates, used in lack of calibration"""
+	def to_screen(self, pos):
+		return pos
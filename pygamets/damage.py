@@ -0,0 +1,124 @@
+"""
+Screen damage region management
+"""
+
+def intersect(a, b):
+	"""Returns the intersection of 2 rectangles or None if they do not intersect"""
+	ax, ay, aw, ah = a
+	bx, by, bw, bh = b
+	x, y = max(ax, bx), max(ay, by)
+	w, h = min(ax + aw, bx + bw) - x, min(ay + ah, by + bh) - y
+	if w <= 0 or h <= 0:
+		return None
+	return x, y, w, h
+
+def touch(a, b):
+	"""Returns True if 2 rectangles overlap or adjacent"""
+	ax, ay, aw, ah = a
+	bx, by, bw, bh = b
+	return not (ax + aw < bx or bx + bw < ax or ay + ah < by or by + bh < ay)
+
+def bounding(a, b):
+	"""Returns the bounding rectangle of 2 rectangles"""
+	ax, ay, aw, ah = a
+	bx, by, bw, bh = b
+	x, y = min(ax, bx), min(ay, by)
+	return x, y, max(ax + aw, bx + bw) - x, max(ay + ah, by + bh) - y
+
+def area(r):
+	return r[2] * r[3]
+
+class DamageRegion(object):
+	"""
+	The set of updated screen areas. The overlapping or adjacent rectangles are
+	merged into the bounding one unless it would add more than merge_waste fraction
+	of not updated area. The rectangles are clipped by the screen area. Once the
+	updated area exceeds the full_ratio fraction of the screen area the full
+	screen update is reported.
+	"""
+	def __init__(self, size = None, full_ratio = .6, merge_waste = .3):
+		self.size = size
+		self.full_ratio = full_ratio
+		self.merge_waste = merge_waste
+		self.clear()
+
+	def clear(self):
+		self.rects = []
+		self.all = False
+
+	def __len__(self):
+		return len(self.rects)
+
+	def empty(self):
+		return not self.all and not self.rects
+
+	def add_all(self):
+		"""Mark the whole screen updated"""
+		self.all = True
+		self.rects = []
+
+	def add(self, rect):
+		"""Add updated rectangle"""
+		if self.all:
+			return
+		if self.size is not None:
+			rect = intersect(rect, (0, 0) + tuple(self.size))
+			if rect is None:
+				return
+		elif rect[2] <= 0 or rect[3] <= 0:
+			return
+		rects = self.rects
+		merged = True
+		while merged:
+			merged = False
+			for i, r in enumerate(rects):
+				if not touch(r, rect):
+					continue
+				b = bounding(r, rect)
+				inter = intersect(r, rect)
+				covered = area(r) + area(rect) - (area(inter) if inter else 0)
+				if area(b) - covered <= self.merge_waste * area(b):
+					del rects[i]
+					rect = b
+					merged = True
+					break
+		rects.append(rect)
+		if self.size is not None:
+			w, h = self.size
+			if sum(area(r) for r in rects) >= self.full_ratio * w * h:
+				self.add_all()
+
+	def update(self, rects):
+		"""Add the sequence of updated rectangles"""
+		for r in rects:
+			self.add(r)
+
+	def get(self):
+		"""Returns the list of updated rectangles or None if the whole screen is updated"""
+		if self.all:
+			return None
+		return list(self.rects)
+
+def subtract(a, b):
+	"""
+	Returns the part of rectangle a not covered by rectangle b. Returns None if a is
+	covered completely and False if the remaining part is not a rectangle.
+	"""
+	i = intersect(a, b)
+	if i is None:
+		return a
+	if i == tuple(a):
+		return None
+	ax, ay, aw, ah = a
+	ix, iy, iw, ih = i
+	if iw == aw:
+		if iy == ay:
+			return ax, ay + ih, aw, ah - ih
+		if iy + ih == ay + ah:
+			return ax, ay, aw, ah - ih
+	if ih == ah:
+		if ix == ax:
+			return ax + iw, ay, aw - iw, ah
+		if ix + iw == ax + aw:
+			return ax, ay, aw - iw, ah
+	return False
@@ -11,8 +11,8 @@ Motivation:
   system which implements its own raw events processing routine.
 """
 
-import os, struct
-from collections import namedtuple
+import io, os, stat, fcntl, struct, threading, time
+from collections import namedtuple, deque
 
 EV_KEY = 1
 EV_ABS = 3
@@ -20,12 +20,29 @@ EV_ABS = 3
 ABS_X = 0
 ABS_Y = 1
 
+# Revoke access to the input device (_IOW('E', 0x91, int))
+EVIOCREVOKE = 0x40044591
+
 EV_FMT = 'QHHI'
 EV_SZ = struct.calcsize(EV_FMT)
 
+# The number of records read from events file at once
+EV_BUF_RECORDS = 256
+
 events_filename = '/dev/input/event0'
 events_file = None
 
+# The trace file header
+TRACE_MAGIC = b'PGTSEVT1'
+
+# The recorder of the raw records read from events file
+recorder = None
+
+# Reusable read buffer and decoders for the batches of records of different lengths
+_ev_buf = bytearray(EV_SZ * EV_BUF_RECORDS)
+_ev_view = memoryview(_ev_buf)
+_ev_decoders = {}
+
 def open_events_file():
 	"""Returns events file object open in non blocking mode"""
 	global events_file
@@ -33,33 +50,269 @@ def open_events_file():
 		# Select does not work for whatever reason on events file
 		# so we have to use non-blocking mode
 		fd = os.open(events_filename, os.O_RDONLY|os.O_NONBLOCK)
-		events_file = os.fdopen(fd, "r")
+		events_file = io.open(fd, 'rb', buffering=0)
 	return events_file
 
-Event = namedtuple('Event', ('down', 'pos'))
+# The ts field is the kernel event time in seconds. The kernel
+# uses CLOCK_REALTIME for events so it is comparable to time.time()
+Event = namedtuple('Event', ('down', 'pos', 'ts'))
 
-def read_events():
-	"""Returns the list of events collected as instances of Event objects"""
-	events = []
-	pos_x, pos_y = None, None
-	f = open_events_file()
+def ev_time(ts):
+	"""Converts raw time field (32 bit seconds and microseconds words) to the time in seconds"""
+	return (ts & 0xffffffff) + (ts >> 32) * 1e-6
 
-	while True:
-		try:
-			e = f.read(EV_SZ)
-		except IOError:
-			break
-		ts, type, code, val = struct.unpack(EV_FMT, e)
+def batch_decoder(n):
+	"""Returns the Struct object decoding n records at once"""
+	d = _ev_decoders.get(n)
+	if d is None:
+		d = _ev_decoders[n] = struct.Struct(EV_FMT * n)
+	return d
+
+def decode_events(data, events = None, pos = None):
+	"""
+	Decode raw records from the buffer and append them to the events list as Event objects.
+	The trailing incomplete record if any is ignored. The optional pos argument is the list
+	of 2 elements keeping the incomplete position between subsequent calls.
+	Returns the list of events.
+	"""
+	if events is None:
+		events = []
+	if pos is None:
+		pos = [None, None]
+	n = len(data) // EV_SZ
+	if not n:
+		return events
+	vals = batch_decoder(n).unpack_from(data)
+	pos_x, pos_y = pos
+	for ts, type, code, val in zip(vals[0::4], vals[1::4], vals[2::4], vals[3::4]):
 		if type == EV_KEY:
 			down = val != 0
-			events.append(Event(down, None))
+			events.append(Event(down, None, ev_time(ts)))
 		elif type == EV_ABS:
 			if code == ABS_X:
 				pos_x = val
 			if code == ABS_Y:
 				pos_y = val
 			if pos_x is not None and pos_y is not None:
-				events.append(Event(None, (pos_x, pos_y)))
+				events.append(Event(None, (pos_x, pos_y), ev_time(ts)))
 				pos_x, pos_y = None, None
+	pos[0], pos[1] = pos_x, pos_y
+	return events
 
+def read_raw(f, buf = _ev_view):
+	"""
+	Read all pending records into the buffer.
+	Returns the number of bytes read which may be less than the buffer size.
+	"""
+	sz, total = len(buf), 0
+	while total < sz:
+		try:
+			n = f.readinto(buf[total:])
+		except IOError:
+			break
+		if not n:
+			break
+		total += n
+	return total
+
+def read_events():
+	"""Returns the list of events collected as instances of Event objects"""
+	events, pos = [], [None, None]
+	f = open_events_file()
+	while True:
+		n = read_raw(f)
+		if n:
+			if recorder is not None:
+				recorder.write(_ev_view[:n])
+			decode_events(_ev_view[:n], events, pos)
+		if n < len(_ev_buf):
+			break
 	return events
+
+class TraceRecorder(object):
+	"""Writes raw events records with their timestamps to the trace file"""
+	def __init__(self, filename):
+		self.file = open(filename, 'wb')
+		self.file.write(TRACE_MAGIC)
+
+	def write(self, data):
+		self.file.write(data)
+
+	def close(self):
+		self.file.close()
+
+def start_recording(filename):
+	"""Start recording raw events to the trace file"""
+	global recorder
+	stop_recording()
+	recorder = TraceRecorder(filename)
+	return recorder
+
+def stop_recording():
+	"""Stop recording raw events"""
+	global recorder
+	if recorder is not None:
+		recorder.close()
+		recorder = None
+
+def trace_times(data):
+	"""Returns the list of raw records times decoded in batches of at most EV_BUF_RECORDS"""
+	times, n = [], len(data) // EV_SZ
+	for first in range(0, n, EV_BUF_RECORDS):
+		cnt = min(EV_BUF_RECORDS, n - first)
+		vals = batch_decoder(cnt).unpack_from(data, first * EV_SZ)
+		times.extend(ev_time(ts) for ts in vals[0::4])
+	return times
+
+class TraceReplay(object):
+	"""
+	The events source reading records from the trace file. It is used in place
+	of the events file object. In real time mode the records are delivered
+	at the same pace as they were recorded (optionally scaled by the speed factor).
+	Otherwise the records within the step seconds are delivered on every
+	read_events call so the replay runs as fast as the event loop runs
+	while producing the same events sequence regardless of the timing.
+	"""
+	def __init__(self, filename, realtime = True, speed = 1., step = .02):
+		with open(filename, 'rb') as f:
+			magic = f.read(len(TRACE_MAGIC))
+			if magic != TRACE_MAGIC:
+				raise ValueError('%s is not an events trace file' % filename)
+			self.data = f.read()
+		self.times = trace_times(self.data)
+		self.realtime = realtime
+		self.speed = speed
+		self.step = step
+		self.next = 0
+		self.start = None
+		self.deadline = None
+
+	def finished(self):
+		"""Returns True if all records are delivered"""
+		return self.next >= len(self.times)
+
+	def readinto(self, buf):
+		"""Copy records due to the current time to the buffer, returns the number of bytes copied"""
+		if self.finished():
+			return 0
+		if self.start is None:
+			self.start = time.time()
+			self.deadline = self.times[0] + self.step
+		if self.realtime:
+			deadline = self.times[0] + (time.time() - self.start) * self.speed
+		else:
+			deadline = self.deadline
+		first = last = self.next
+		end = min(len(self.times), first + len(buf) // EV_SZ)
+		while last < end and self.times[last] <= deadline:
+			last += 1
+		if last == first:
+			# Nothing left before the deadline, advance it on the next read_events call
+			self.deadline += self.step
+			return 0
+		self.next = last
+		n = (last - first) * EV_SZ
+		buf[:n] = self.data[first * EV_SZ:last * EV_SZ]
+		return n
+
+	def close(self):
+		pass
+
+def replay(filename, realtime = True, speed = 1., step = .02):
+	"""
+	Use the trace file as the source of events in place of the events file.
+	Returns the TraceReplay object.
+	"""
+	global events_file
+	if events_file is not None:
+		events_file.close()
+	events_file = TraceReplay(filename, realtime, speed, step)
+	return events_file
+
+class EventsReader(threading.Thread):
+	"""
+	The thread reading events file in blocking mode. The decoded events are
+	put onto the queue and the wakeup callback is called on every new portion
+	of events so the event loop does not have to poll events file. The reader
+	accepts any file providing events records, for example FIFO standing
+	in place of the touch screen device. The FIFO is open for writing as well
+	so it never reports end of file when the writers come and go.
+	"""
+	def __init__(self, wakeup = None, filename = None):
+		threading.Thread.__init__(self, name = 'EventsReader')
+		self.daemon = True
+		self.filename = filename if filename is not None else events_filename
+		self.wakeup = wakeup
+		# The deque append / popleft are atomic so no locking is necessary
+		self.queue = deque()
+		self.buf = bytearray(EV_SZ * EV_BUF_RECORDS)
+		self.stopped = False
+		# The events file descriptor guarded by the lock against closing while interrupted
+		self.fd = None
+		self.lock = threading.Lock()
+
+	def run(self):
+		buf, pos = memoryview(self.buf), [None, None]
+		flags = os.O_RDWR if stat.S_ISFIFO(os.stat(self.filename).st_mode) else os.O_RDONLY
+		with self.lock:
+			if self.stopped:
+				return
+			self.fd = os.open(self.filename, flags)
+		f = io.open(self.fd, 'rb', buffering=0, closefd=False)
+		try:
+			while not self.stopped:
+				try:
+					n = f.readinto(buf)
+				except (IOError, OSError):
+					# The device access is revoked on stop or the device has gone
+					break
+				if not n or self.stopped:
+					break
+				rec = recorder
+				if rec is not None:
+					rec.write(buf[:n])
+				evs = decode_events(buf[:n], None, pos)
+				if evs:
+					self.queue.extend(evs)
+					if self.wakeup is not None:
+						self.wakeup()
+		finally:
+			with self.lock:
+				os.close(self.fd)
+				self.fd = None
+
+	def interrupt(self):
+		"""Make the blocking read return"""
+		fd = self.fd
+		mode = os.fstat(fd).st_mode
+		if stat.S_ISCHR(mode):
+			# Revoking the input device access wakes up the reader
+			try:
+				fcntl.ioctl(fd, EVIOCREVOKE, 0)
+			except IOError:
+				# Not supported, the reader exits on the next event
+				pass
+		elif stat.S_ISFIFO(mode):
+			# The FIFO is open for writing as well
+			os.write(fd, b'\0' * EV_SZ)
+
+	def stop(self, timeout = 1.):
+		"""
+		Stop reading and wait for the thread termination. The thread closes events
+		file on exit. No events are queued and the wakeup is not called after stop.
+		"""
+		with self.lock:
+			if self.stopped:
+				return
+			self.stopped = True
+			if self.fd is not None:
+				self.interrupt()
+		if self.is_alive():
+			self.join(timeout)
+
+	def read_events(self):
+		"""Returns the list of events collected so far"""
+		events, q = [], self.queue
+		while q:
+			events.append(q.popleft())
+		return events
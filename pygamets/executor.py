@@ -0,0 +1,134 @@
+"""
+Background execution facilities.
+
+The Future object represents the result of the function executed
+asynchronously. Its completion callbacks are passed to the deliver
+routine (typically Application.add_job) so they are called in the
+context of the event loop. The ThreadPool executes functions in
+the fixed set of daemon threads.
+"""
+
+import sys, threading, functools
+try:
+	import Queue as queue
+except ImportError:
+	import queue
+
+class Future(object):
+	"""The result of asynchronous call"""
+	def __init__(self, deliver = None):
+		self._cond = threading.Condition()
+		self._done = False
+		self._result = None
+		self._exception = None
+		self._callbacks = []
+		self._deliver = deliver
+
+	def done(self):
+		"""Returns True if the call is completed"""
+		return self._done
+
+	def _wait(self, timeout):
+		with self._cond:
+			if not self._done:
+				self._cond.wait(timeout)
+			if not self._done:
+				raise RuntimeError('timeout waiting for result')
+
+	def result(self, timeout = None):
+		"""
+		Wait for completion and return the result or raise the exception raised by the call.
+		Never wait in the event loop context for the call to be executed in that context.
+		"""
+		self._wait(timeout)
+		if self._exception is not None:
+			raise self._exception
+		return self._result
+
+	def exception(self, timeout = None):
+		"""Wait for completion and return the exception raised by the call or None"""
+		self._wait(timeout)
+		return self._exception
+
+	def add_done_callback(self, cb):
+		"""Add callback to be called with the future as the argument on completion"""
+		with self._cond:
+			if not self._done:
+				self._callbacks.append(cb)
+				return
+		self._call(cb)
+
+	def set_result(self, result):
+		self._complete(result, None)
+
+	def set_exception(self, exc):
+		self._complete(None, exc)
+
+	def set_from(self, other):
+		"""Complete with the outcome of the other completed future (possibly concurrent.futures one)"""
+		exc = other.exception()
+		if exc is not None:
+			self.set_exception(exc)
+		else:
+			self.set_result(other.result())
+
+	def _complete(self, result, exc):
+		with self._cond:
+			assert not self._done
+			self._result, self._exception = result, exc
+			self._done = True
+			self._cond.notify_all()
+			callbacks, self._callbacks = self._callbacks, []
+		for cb in callbacks:
+			self._call(cb)
+
+	def _call(self, cb):
+		if self._deliver is not None:
+			self._deliver(functools.partial(cb, self))
+		else:
+			cb(self)
+
+def run(future, fn, args, kwargs):
+	"""Call function and complete future with its outcome"""
+	try:
+		res = fn(*args, **kwargs)
+	except Exception as e:
+		future.set_exception(e)
+	else:
+		future.set_result(res)
+
+class ThreadPool(object):
+	"""The pool of threads executing submitted functions"""
+	def __init__(self, n_threads = 2, deliver = None):
+		self.n_threads = n_threads
+		self.deliver = deliver
+		self.queue = queue.Queue()
+		self.threads = []
+
+	def submit(self, fn, *args, **kwargs):
+		"""Submit function for execution, returns Future object"""
+		if not self.threads:
+			for i in range(self.n_threads):
+				t = threading.Thread(target = self.worker, name = 'ThreadPool-%d' % i)
+				t.daemon = True
+				t.start()
+				self.threads.append(t)
+		f = Future(self.deliver)
+		self.queue.put((f, fn, args, kwargs))
+		return f
+
+	def worker(self):
+		while True:
+			item = self.queue.get()
+			if item is None:
+				break
+			run(*item)
+
+	def shutdown(self, wait = True):
+		"""Stop threads after completion of the already submitted functions"""
+		for _ in self.threads:
+			self.queue.put(None)
+		if wait:
+			for t in self.threads:
+				t.join()
+		self.threads = []
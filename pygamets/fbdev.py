@@ -0,0 +1,120 @@
+"""
+Memory mapped framebuffer display backend.
+
+The screen draws to the shadow surface having the framebuffer pixel format
+(typically 16 bit RGB565) so the format conversion is done by the SDL drawing
+and blitting routines. The updated rectangles are copied from the shadow surface
+to the mapped framebuffer memory row by row bypassing the SDL display driver.
+Any regular file may be used in place of the framebuffer device for testing.
+
+Usage:
+	screen.init_mode(backend = fbdev.Framebuffer('/dev/fb1'))
+
+The SDL video subsystem is still used for event processing so it is reasonable
+to run it with the dummy driver (SDL_VIDEODRIVER=dummy) in such configuration.
+"""
+
+import os, stat, mmap, struct, ctypes
+import pygame as pg
+
+FBIOGET_VSCREENINFO = 0x4600
+FBIOGET_FSCREENINFO = 0x4602
+
+# The leading fields of fb_var_screeninfo: resolution, virtual resolution, offsets,
+# bits per pixel, grayscale flag and red, green, blue, transp bitfields
+_VAR_INFO = struct.Struct('8I12I')
+_VAR_INFO_SIZE = 160
+# The leading fields of fb_fix_screeninfo up to line_length
+_FIX_INFO = struct.Struct('16sL4I3HI')
+_FIX_INFO_SIZE = 80
+
+# The default pixel format masks for regular files
+MASKS = {
+	16: (0xf800, 0x07e0, 0x001f, 0),
+	32: (0xff0000, 0x00ff00, 0x0000ff, 0),
+}
+
+class Framebuffer(object):
+	"""
+	The framebuffer display backend. The size and bpp are used for regular files
+	only, they are queried from the device otherwise.
+	"""
+	def __init__(self, path = '/dev/fb1', size = None, bpp = 16):
+		self.path = path
+		self.size = size
+		self.bpp = bpp
+		self.masks = MASKS.get(bpp)
+		self.line_length = None
+		self.fd = None
+		self.mem = None
+		self.mem_ptr = None
+		self.surface = None
+
+	def query_device(self):
+		"""Get the framebuffer geometry and pixel format from the device"""
+		# not available on win32 where the package is imported as well
+		import fcntl
+		var = _VAR_INFO.unpack_from(fcntl.ioctl(self.fd, FBIOGET_VSCREENINFO, b'\0' * _VAR_INFO_SIZE))
+		fix = _FIX_INFO.unpack_from(fcntl.ioctl(self.fd, FBIOGET_FSCREENINFO, b'\0' * _FIX_INFO_SIZE))
+		self.size = var[0], var[1]
+		self.bpp = var[6]
+		# (offset, length, msb_right) for red, green, blue, transp
+		fields = [var[8 + 3 * i: 11 + 3 * i] for i in range(4)]
+		self.masks = tuple(((1 << length) - 1) << offset for offset, length, _ in fields)
+		self.line_length = fix[-1]
+
+	def init(self, mode = None):
+		"""Map the framebuffer and create the shadow surface, returns the surface"""
+		self.fd = os.open(self.path, os.O_RDWR)
+		if stat.S_ISCHR(os.fstat(self.fd).st_mode):
+			self.query_device()
+		else:
+			if mode is not None:
+				self.size = mode
+			assert self.size is not None, 'the size is required for regular files'
+			self.line_length = self.size[0] * self.bpp // 8
+		w, h = self.size
+		length = self.line_length * h
+		if os.fstat(self.fd).st_size < length:
+			os.ftruncate(self.fd, length)
+		self.mem = mmap.mmap(self.fd, length, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+		self.mem_ptr = ctypes.c_char.from_buffer(self.mem)
+		self.surface = pg.Surface((w, h), 0, self.bpp, self.masks)
+		return self.surface
+
+	def update(self, rects = None):
+		"""Copy the updated rectangles (the whole surface if None) to the framebuffer"""
+		w, h = self.size
+		if rects is None:
+			rects = [(0, 0, w, h)]
+		pixel = self.surface.get_bytesize()
+		pitch = self.surface.get_pitch()
+		dst_addr = ctypes.addressof(self.mem_ptr)
+		# The surface is locked while the buffer is referenced
+		buf = self.surface.get_buffer()
+		src_addr = self.surface._pixels_address
+		for r in rects:
+			x, y, rw, rh = pg.Rect(r).clip(0, 0, w, h)
+			n = rw * pixel
+			if n <= 0:
+				continue
+			src = src_addr + y * pitch + x * pixel
+			dst = dst_addr + y * self.line_length + x * pixel
+			if n == pitch == self.line_length:
+				ctypes.memmove(dst, src, n * rh)
+				continue
+			for _ in range(rh):
+				ctypes.memmove(dst, src, n)
+				src += pitch
+				dst += self.line_length
+		del buf
+
+	def close(self):
+		"""Unmap the framebuffer"""
+		if self.mem is None:
+			return
+		self.mem_ptr = None
+		self.mem.close()
+		os.close(self.fd)
+		self.mem = self.fd = None
+		self.surface = None
@@ -0,0 +1,202 @@
+"""
+Raw touch screen input filters.
+
+The filter stages are placed between the raw events reader and the
+application events handler. Every stage is callable taking the iterable
+of events.Event objects and returning the generator of filtered events.
+The stages are called on every event loop iteration even if there are no
+new events so the stages holding events may release them in time. The stage
+holding events reports the release time by next_release so the event loop
+waiting for events wakes up in time.
+"""
+
+import time
+from collections import deque
+from events import Event
+
+class Filter(object):
+	"""The base class for filter stages counting events passed in and out"""
+	def __init__(self):
+		self.n_in = 0
+		self.n_out = 0
+
+	def __call__(self, events):
+		for e in self.filter(self.count_in(events)):
+			self.n_out += 1
+			yield e
+
+	def count_in(self, events):
+		for e in events:
+			self.n_in += 1
+			yield e
+
+	def filter(self, events):
+		"""Filtering generator to be implemented in subclasses"""
+		for e in events:
+			yield e
+
+	def next_release(self):
+		"""
+		Returns the time (comparable to time.time()) the event held by the stage
+		is to be released at or None if there are no events held.
+		"""
+		return None
+
+	def counters(self):
+		"""Returns the number of events passed in and out as a tuple"""
+		return self.n_in, self.n_out
+
+	def reset_counters(self):
+		self.n_in = 0
+		self.n_out = 0
+
+class MedianFilter(Filter):
+	"""Replaces position by the median of the last n samples since the touch begins"""
+	def __init__(self, n = 3):
+		Filter.__init__(self)
+		self.n = n
+		self.xs, self.ys = deque(maxlen = n), deque(maxlen = n)
+
+	def filter(self, events):
+		for e in events:
+			if e.pos is None:
+				self.xs.clear()
+				self.ys.clear()
+				yield e
+				continue
+			x, y = e.pos
+			self.xs.append(x)
+			self.ys.append(y)
+			m = len(self.xs) // 2
+			yield Event(None, (sorted(self.xs)[m], sorted(self.ys)[m]), e.ts)
+
+class LowPassFilter(Filter):
+	"""Exponential smoothing of position with the weight k of the new sample"""
+	def __init__(self, k = .5):
+		Filter.__init__(self)
+		self.k = k
+		self.pos = None
+
+	def filter(self, events):
+		k = self.k
+		for e in events:
+			if e.pos is None:
+				self.pos = None
+				yield e
+				continue
+			if self.pos is None:
+				self.pos = e.pos
+			else:
+				(x, y), (px, py) = e.pos, self.pos
+				self.pos = int(round(px + k*(x - px))), int(round(py + k*(y - py)))
+			yield Event(None, self.pos, e.ts)
+
+class DeadZone(Filter):
+	"""Drops position samples closer than radius to the last passed one"""
+	def __init__(self, radius = 8):
+		Filter.__init__(self)
+		self.radius = radius
+		self.pos = None
+
+	def filter(self, events):
+		r2 = self.radius * self.radius
+		for e in events:
+			if e.pos is None:
+				self.pos = None
+				yield e
+				continue
+			if self.pos is not None:
+				(x, y), (px, py) = e.pos, self.pos
+				if (x - px)*(x - px) + (y - py)*(y - py) < r2:
+					continue
+			self.pos = e.pos
+			yield e
+
+class Debounce(Filter):
+	"""
+	Drops repeated press / release events as well as release followed by
+	the press in less than interval seconds. The release is held back for
+	the interval so it is delivered with that delay. The position samples
+	following the held release are held back as well since some drivers
+	report position before the press.
+	"""
+	def __init__(self, interval = .05):
+		Filter.__init__(self)
+		self.interval = interval
+		self.down = None
+		self.release = None
+		self.held = []
+
+	def flush(self):
+		"""Returns the held release followed by the held position samples"""
+		evs = [self.release] + self.held
+		self.release, self.held = None, []
+		return evs
+
+	def filter(self, events):
+		for e in events:
+			if self.release is not None and e.ts - self.release.ts >= self.interval:
+				for h in self.flush():
+					yield h
+			if e.down is not None:
+				if e.down == self.down:
+					continue
+				if not e.down:
+					self.release = e
+					self.down = False
+					continue
+				self.down = True
+				if self.release is not None:
+					# The bounce, keep the touch going
+					for h in self.flush()[1:]:
+						yield h
+					continue
+				yield e
+			elif self.release is not None:
+				self.held.append(e)
+			else:
+				yield e
+		if self.release is not None and time.time() - self.release.ts >= self.interval:
+			for h in self.flush():
+				yield h
+
+	def next_release(self):
+		if self.release is None:
+			return None
+		return self.release.ts + self.interval
+
+class RateLimit(Filter):
+	"""
+	Passes at most one position sample per interval seconds.
+	The last dropped sample is delivered before the press / release
+	event or after the interval expiration so the final position is not lost.
+	"""
+	def __init__(self, interval = .02):
+		Filter.__init__(self)
+		self.interval = interval
+		self.last_ts = None
+		self.pending = None
+
+	def filter(self, events):
+		for e in events:
+			if e.pos is None:
+				if self.pending is not None:
+					yield self.pending
+					self.pending = None
+				self.last_ts = None
+				yield e
+			elif self.last_ts is None or e.ts - self.last_ts >= self.interval:
+				self.pending = None
+				self.last_ts = e.ts
+				yield e
+			else:
+				self.pending = e
+		if self.pending is not None and time.time() - self.last_ts >= self.interval:
+			yield self.pending
+			self.last_ts = self.pending.ts
+			self.pending = None
+
+	def next_release(self):
+		if self.pending is None:
+			return None
+		return self.last_ts + self.interval
@@ -10,6 +10,7 @@ class Frame(gui.View):
 	def __init__(self, w, h, st = None):
 		gui.View.__init__(self, w, h)
 		self.style = style.bind(self, st)
+		self.opaque = self.style.f_color is not None
 
 	def int_frame(self):
 		"""Take into account border if present"""
@@ -2,7 +2,13 @@
 GUI micro-framework core classes
 """
 
+import time
 import pygame as pg
+import app
+from latency import LatencyHistogram
+from damage import DamageRegion, intersect, subtract
+import cache
+from spatial import GridIndex
 
 class View(object):
 	"""The base class for all GUI elements"""
@@ -13,10 +19,20 @@ class View(object):
 		# The screen coordinates are unknown at the time of instance creation
 		self.screen_x, self.screen_y = None, None
 		self.parent = None
+		# The window is known since initialization
+		self.window = None
+		# The (occlusion map generation, visible, clip rect) tuple maintained by the screen
+		self.visibility = None
 		self.children = []
 		self.surface = None
 		self.interactive = False
 		self.has_focus = False
+		# Keep rendered image in the surface cache (see set_cached)
+		self.cached = False
+		# The view paints its whole frame so the cached image does not depend
+		# on the ancestors. Should be reset by the views drawing over the parent
+		# background (see invalidate_cache).
+		self.opaque = True
 
 	def cover_rect(self, (x, y, w, h)):
 		"""
@@ -37,8 +53,13 @@ class View(object):
 
 	def origin(self):
 		"""Calculates coordinates of the top-left corner in the screen coordinates system"""
-		assert self.parent is not None
-		px, py = self.parent.origin()
+		p = self.parent
+		assert p is not None
+		if isinstance(p, View) and p.screen_x is not None:
+			# Use the parent cached screen coordinates
+			px, py = p.screen_x, p.screen_y
+		else:
+			px, py = p.origin()
 		return px + self.x, py + self.y
 
 	def frame(self):
@@ -79,6 +100,38 @@ class View(object):
 		v.x, v.y = x, y
 		v.parent = self
 		self.children.append(v)
+		if self.initialized():
+			# Adding to the view shown on the screen
+			v.apply_recursively(lambda c: c.init(self.surface))
+			self.get_window().index_views(v)
+			v.update()
+
+	def move(self, x, y):
+		"""
+		Move the view to the new position relative to the parent. The parent is redrawn
+		in the old area and the view is redrawn in the new one before the display refresh.
+		"""
+		p = self.parent
+		assert isinstance(p, View), 'the window root view can not be moved'
+		ix, iy, iw, ih = p.int_frame()
+		assert ix <= x and x + self.w <= ix + iw
+		assert iy <= y and y + self.h <= iy + ih
+		if (x, y) == (self.x, self.y):
+			return
+		self.invalidate_cache()
+		old = self.frame()
+		self.x, self.y = x, y
+		if not self.initialized():
+			return
+		self.apply_recursively(lambda v: v.update_origin())
+		self.get_window().move_views(self)
+		self.get_screen().invalidate_area(p, old)
+		self.update()
+
+	def update_origin(self):
+		"""Update cached screen coordinates after moving the view or its ancestor"""
+		self.screen_x, self.screen_y = self.origin()
+		self.visibility = None
 
 	def apply_recursively(self, cb):
 		"""Call callback with the view as arguments and do it with all children recursively"""
@@ -90,6 +143,7 @@ class View(object):
 		"""Initialization routine called on first showing on the screen"""
 		self.surface = surface
 		self.screen_x, self.screen_y = self.origin()
+		self.window = self.parent.get_window()
 
 	def initialized(self):
 		return self.surface is not None
@@ -97,9 +151,24 @@ class View(object):
 	def fini(self):
 		"""Finalization routine called on removing from the screen"""
 		self.surface = None
+		self.window = None
+		self.visibility = None
+		if self.cached:
+			cache.instance.discard(self)
+
+	def set_cached(self, cached = True):
+		"""
+		Enable / disable caching the rendered view image (including children).
+		Worth enabling for the views that are expensive to draw and rarely updated.
+		"""
+		self.cached = cached
+		if not cached:
+			cache.instance.discard(self)
 
 	def get_window(self):
 		"""Returns window object"""
+		if self.window is not None:
+			return self.window
 		assert self.parent is not None
 		return self.parent.get_window()
 
@@ -119,8 +188,37 @@ class View(object):
 
 	def redraw(self):
 		"""Draw this view and all children recursively"""
+		if self.cached:
+			surf = cache.instance.get(self)
+			if surf is not None:
+				self.surface.blit(surf, (self.screen_x, self.screen_y))
+				return
 		self.draw()
 		self.redraw_children()
+		if self.cached and self.surface.get_clip().contains(self.frame()):
+			cache.instance.put(self, self.surface.subsurface(self.frame()).copy())
+
+	def invalidate_cache(self):
+		"""
+		Drop cached images affected by the view update. The ancestors images contain
+		this view. The descendants images are kept unless they are not opaque
+		so contain this view background.
+		"""
+		c = cache.instance
+		if not c.surfaces:
+			return
+		c.discard(self)
+		self.discard_transparent_children(c)
+		p = self.parent
+		while isinstance(p, View):
+			c.discard(p)
+			p = p.parent
+
+	def discard_transparent_children(self, c):
+		for ch in self.children:
+			if not ch.opaque:
+				c.discard(ch)
+				ch.discard_transparent_children(c)
 
 	def redraw_children(self, rect = None):
 		"""Redraw children and returns their list"""
@@ -132,10 +230,13 @@ class View(object):
 		return updated
 
 	def update(self):
-		"""Redraw if visible on the screen"""
-		if self.is_visible():
-			self.redraw()
-			self.set_updated()
+		"""
+		Schedule redrawing if visible on the screen. The view is redrawn by the screen
+		just before the display refresh so multiple updates result in single redraw.
+		"""
+		self.invalidate_cache()
+		if self.initialized():
+			self.get_screen().invalidate(self)
 
 	def set_updated(self, rects = None):
 		"""Notify the screen area updated"""
@@ -196,6 +297,13 @@ class Window(object):
 		self.w, self.h = v.w, v.h
 		self.in_focus = None
 		self.screen = None
+		# The frames of the windows above covering this one (see Screen.update_occlusion)
+		self.covers = []
+		# The screen pixels under the window saved on showing (see Screen.show)
+		self.save_under = None
+		# The spatial index of interactive views built on showing
+		self.hit_index = None
+		self.hit_cell = 32
 		self.view = v
 		v.x, v.y = 0, 0
 		v.parent = self
@@ -216,12 +324,15 @@ class Window(object):
 		"""Returns the size of internal area available for child elements placement"""
 		return self.view.int_size()
 
-	def cover_rect(self, rect):
+	def cover_rect(self, (x, y, w, h)):
 		"""
-		Returns True if the view area has non-empty intersection with given rect.
-		The rect coordinates are assumed to be in the parent coordinate system.
+		Returns True if the window area has non-empty intersection with given rect.
+		The rect coordinates are assumed to be in the screen coordinate system.
 		"""
-		return self.view.cover_rect(rect)
+		return not (
+			x + w <= self.x or self.x + self.w <= x or
+			y + h <= self.y or self.y + self.h <= y
+		)
 
 	def cover_screen_pos(self, pos):
 		"""Returns True if the view contains given point in the screen coordinate system"""
@@ -246,12 +357,16 @@ class Window(object):
 		"""Attach window to the screen"""
 		self.screen = screen
 		self.view.apply_recursively(lambda v: v.init(screen.surface))
+		self.hit_index = GridIndex(self.hit_cell)
+		self.hit_index.add_tree(self.view, ())
 
 	def fini(self):
 		"""Finalization routine called on removing window from the screen"""
 		self.clear_focus()
 		self.view.apply_recursively(lambda v: v.fini())
 		self.screen = None
+		self.save_under = None
+		self.hit_index = None
 
 	def get_window(self):
 		"""Get window object (self)"""
@@ -265,19 +380,42 @@ class Window(object):
 	def redraw(self):
 		self.view.redraw()		
 
+	def index_views(self, v):
+		"""Add interactive views of the given subtree to the spatial index"""
+		if self.hit_index is None:
+			return
+		path = []
+		c, p = v, v.parent
+		while isinstance(p, View):
+			path.append(p.children.index(c))
+			c, p = p, p.parent
+		path.reverse()
+		self.hit_index.add_tree(v, tuple(path))
+
+	def move_views(self, v):
+		"""Update the spatial index positions of the moved subtree views"""
+		if self.hit_index is not None:
+			v.apply_recursively(self.hit_index.move)
+
+	def find_interactive(self, pos):
+		"""Find interactive view at given screen position"""
+		if self.hit_index is not None:
+			return self.hit_index.find(pos)
+		return self.view.find_interactive(pos)
+
 	def deliver_mouse_event(self, e):
 		"""Mouse events handler"""
 		if e.type == pg.MOUSEBUTTONDOWN:
 			if self.in_focus is not None:
 				self.in_focus.set_focus(False)
-			self.in_focus = self.view.find_interactive(e.pos)
+			self.in_focus = self.find_interactive(e.pos)
 			if self.in_focus is not None:
 				self.in_focus.set_focus(True)
 				self.in_focus.on_mouse_event(e)
 		elif e.type == pg.MOUSEBUTTONUP:
 			if self.in_focus is not None:
 				in_focus = self.in_focus
-				lost_focus = self.view.find_interactive(e.pos) != in_focus
+				lost_focus = self.find_interactive(e.pos) != in_focus
 				if lost_focus:
 					in_focus.set_focus(False)
 					self.in_focus = None
@@ -294,17 +432,38 @@ class Screen(object):
 	"""The screen object implements the ordered list of windows and maintain the list of updated areas"""
 	def __init__(self):
 		self.surface = None
+		self.backend = None
 		self.windows = []
-		self.updated = set()
-		self.updated_all = False
+		# The occlusion map: window indexes and the map generation
+		self.window_index = {}
+		self.occlusion_gen = 0
+		self.damage = DamageRegion()
 		self.run_clock = None
-
-	def init_mode(self, mode = None):
-		"""Init display mode"""
-		if mode is not None:
+		# The views to be redrawn before the display refresh
+		self.dirty = set()
+		# The (view, screen rect) areas to be redrawn before the display refresh
+		self.dirty_areas = []
+		# Input to display latency statistics (disabled by default)
+		self.latency = None
+		self.input_ts = []
+
+	def init_mode(self, mode = None, backend = None):
+		"""
+		Init display mode. The optional backend object (see fbdev.Framebuffer) replaces
+		the SDL display. It should provide init(mode) returning the surface to draw to
+		and update(rects) copying updated rectangles (all if None) to the display.
+		"""
+		self.backend = backend
+		if backend is not None:
+			self.surface = backend.init(mode)
+		elif mode is not None:
 			self.surface = pg.display.set_mode(mode)
 		else:
 			self.surface = pg.display.set_mode()
+		self.damage.size = self.surface.get_size()
+		if app.instance is not None and app.instance.headless:
+			# The touch screen size is not known before the mode is set
+			app.instance.set_screen_size(*self.damage.size)
 
 	def size(self):
 		"""Returns display size as (w, h) pair"""
@@ -320,53 +479,225 @@ class Screen(object):
 		else:
 			return None
 
-	def show(self, wnd):
-		"""Show given window on the screen"""
+	def show(self, wnd, save_under = False):
+		"""
+		Show given window on the screen. If save_under is True the screen pixels
+		under the window are saved so closing it just restores them instead of
+		redrawing all windows.
+		"""
 		assert self.surface is not None
 		top_wnd = self.top_window()
 		if top_wnd is not None:
 			top_wnd.clear_focus()
+		if save_under:
+			self.draw_dirty()
+			f = intersect((wnd.x, wnd.y, wnd.w, wnd.h), self.surface.get_rect())
+			if f is not None:
+				wnd.save_under = f, self.surface.subsurface(f).copy()
 		self.windows.append(wnd)
+		self.update_occlusion()
 		wnd.init(self)
 		wnd.redraw()
 		self.set_updated([wnd.frame()])
 
 	def close(self, wnd):
 		"""Remove given window from the screen"""
+		saved = wnd.save_under
+		if saved is not None and wnd is self.top_window():
+			wnd.fini()
+			self.windows.pop()
+			self.update_occlusion()
+			f, surf = saved
+			self.surface.blit(surf, f[:2])
+			self.set_updated([f])
+			return
+		i = self.window_index[wnd]
 		wnd.fini()
 		self.windows.remove(wnd)
+		self.update_occlusion()
+		# The saved pixels of the windows above contain the removed one
+		for w in self.windows[i:]:
+			w.save_under = None
 		self.redraw()
 
+	def update_occlusion(self):
+		"""Rebuild the occlusion map, called when the windows list is changed"""
+		self.window_index = dict((w, i) for i, w in enumerate(self.windows))
+		for i, w in enumerate(self.windows):
+			f = w.x, w.y, w.w, w.h
+			w.covers = [(u.x, u.y, u.w, u.h) for u in self.windows[i+1:] if u.cover_rect(f)]
+		self.occlusion_gen += 1
+
+	def get_visibility(self, v):
+		"""
+		Returns the (visible, clip) pair for the given view. The clip is the visible
+		rectangle if the view is partially covered by the windows above or None
+		if it is not covered at all.
+		"""
+		vis = v.visibility
+		if vis is None or vis[0] != self.occlusion_gen:
+			f, visible, clip = v.frame(), True, None
+			for c in v.get_window().covers:
+				r = subtract(clip or f, c)
+				if not r:
+					# Covered completely or the visible part is not a rectangle
+					visible, clip = False, None
+					break
+				if r != (clip or f):
+					clip = r
+			vis = v.visibility = self.occlusion_gen, visible, clip
+		return vis[1], vis[2]
+
 	def is_visible(self, v):
-		"""Returns True if given view is visible"""
-		f, wnd = v.frame(), v.get_window()
-		i = self.windows.index(wnd)
-		for w in self.windows[i+1:]:
-			if w.cover_rect(f):
-				return False
-		return True
+		"""Returns True if given view is visible at least partially (see get_visibility)"""
+		return self.get_visibility(v)[0]
 
 	def redraw(self):
 		"""Redraw all windows"""
+		self.dirty = set()
+		self.dirty_areas = []
 		for w in self.windows:
 			w.redraw()
 		self.set_updated()
 
+	def invalidate(self, v):
+		"""Schedule view redrawing before the display refresh"""
+		self.dirty.add(v)
+		self.drop_saved_over(v.get_window(), v.frame())
+
+	def invalidate_area(self, v, rect):
+		"""Schedule redrawing the view in the given screen area before the display refresh"""
+		self.dirty_areas.append((v, rect))
+		self.drop_saved_over(v.get_window(), rect)
+
+	def drop_saved_over(self, wnd, rect):
+		"""The area covered by the windows above makes their saved pixels stale"""
+		if not wnd.covers:
+			return
+		for w in self.windows[self.window_index[wnd]+1:]:
+			if w.save_under is not None and intersect(w.save_under[0], rect) is not None:
+				w.save_under = None
+
+	def z_order(self, v):
+		"""Returns the sort key ordering views in the drawing order"""
+		path = []
+		p = v.parent
+		while isinstance(p, View):
+			path.append(p.children.index(v))
+			v, p = p, p.parent
+		path.reverse()
+		return self.window_index[p], path
+
+	def draw_dirty(self):
+		"""Redraw views scheduled for redrawing"""
+		if self.dirty_areas:
+			self.draw_dirty_areas()
+		if not self.dirty:
+			return
+		dirty, self.dirty = self.dirty, set()
+		visible = set(v for v in dirty if v.initialized() and self.is_visible(v))
+		views = []
+		for v in visible:
+			# Skip the view if it is redrawn together with its ancestor
+			p = v.parent
+			while isinstance(p, View) and p not in visible:
+				p = p.parent
+			if not isinstance(p, View):
+				views.append(v)
+		views.sort(key = self.z_order)
+		for v in views:
+			_, clip = self.get_visibility(v)
+			if clip is None:
+				v.redraw()
+				v.set_updated()
+			else:
+				# Partially covered view, draw the visible part only
+				self.surface.set_clip(clip)
+				v.redraw()
+				self.surface.set_clip(None)
+				v.set_updated([clip])
+
+	def draw_dirty_areas(self):
+		"""Redraw view areas scheduled for redrawing"""
+		areas, self.dirty_areas = self.dirty_areas, []
+		for v, rect in areas:
+			if not v.initialized():
+				continue
+			visible, clip = self.get_visibility(v)
+			if not visible:
+				continue
+			r = intersect(rect, clip or v.frame())
+			if r is None:
+				continue
+			self.surface.set_clip(r)
+			v.draw()
+			v.redraw_children((r[0] - v.screen_x, r[1] - v.screen_y, r[2], r[3]))
+			self.surface.set_clip(None)
+			self.set_updated([r])
+
+	def save_png(self, path, view = None):
+		"""Save the screen or the given view area to the PNG file"""
+		surf = self.surface
+		if view is not None:
+			surf = surf.subsurface(surf.get_rect().clip(view.frame()))
+		pg.image.save(surf, path)
+
 	def set_updated(self, rects = None):
 		"""Notify the given area is updated"""
 		if rects is None:
-			self.updated_all = True
+			self.damage.add_all()
 		else:
-			self.updated.update(rects)
+			self.damage.update(rects)
+
+	def set_full_update_ratio(self, ratio):
+		"""Set the fraction of the screen area updated that triggers the full screen update"""
+		self.damage.full_ratio = ratio
 
 	def refresh(self):
-		"""Update display for all updated areas"""
-		if self.updated_all:
+		"""
+		Run the budgeted background work (see Application.frame_budget), advance
+		animations, redraw invalidated views and update display for all updated areas.
+		Should be called once per event loop iteration.
+		"""
+		if app.instance is not None:
+			app.instance.run_budgeted_work()
+			app.instance.animation.advance()
+		self.draw_dirty()
+		updated = not self.damage.empty()
+		if updated:
+			self.update_display()
+		if self.input_ts:
+			if updated:
+				now = time.time()
+				for ts in self.input_ts:
+					self.latency.add(now - ts)
+			self.input_ts = []
+
+	def update_display(self):
+		"""Copy the updated areas to the display"""
+		rects = self.damage.get()
+		if self.backend is not None:
+			self.backend.update(rects)
+		elif rects is None:
 			pg.display.update()
-		elif self.updated:
-			pg.display.update([frame for frame in self.updated])
-		self.updated = set()
-		self.updated_all = False
+		else:
+			pg.display.update(rects)
+		self.damage.clear()
+
+	def enable_latency_stats(self, enable = True):
+		"""
+		Enable / disable collecting input to display latency statistics.
+		The latency is measured from the kernel input event time to the display
+		update following the processing of that event. Returns the statistics
+		object (LatencyHistogram instance) or None if disabled.
+		"""
+		if enable:
+			if self.latency is None:
+				self.latency = LatencyHistogram()
+		else:
+			self.latency = None
+			self.input_ts = []
+		return self.latency
 
 	def deliver_mouse_event(self, e):
 		"""Route mouse event to proper window"""
@@ -382,16 +713,26 @@ class Screen(object):
 
 	def handle_event(self, e):
 		"""Event handler"""
+		if self.latency is not None:
+			ts = getattr(e, 'ts', None)
+			if ts is not None:
+				self.input_ts.append(ts)
 		if e.type == pg.MOUSEBUTTONDOWN or e.type == pg.MOUSEBUTTONUP or e.type == pg.MOUSEMOTION:
 			self.deliver_mouse_event(e)
 		else:
 			self.deliver_event(e)
 
-	def run_event_loop(self, max_fps = 0):
-		"""Run event loop optionally limiting fps rate"""
+	def run_event_loop(self, max_fps = 0, idle = False):
+		"""
+		Run event loop optionally limiting fps rate.
+		In idle mode the loop sleeps until the next timer expiration, job or input event
+		instead of running continuously.
+		"""
 		self.run_clock = pg.time.Clock()
 		try:
 			while True:
+				if idle and app.instance is not None:
+					app.instance.wait_events()
 				self.run_clock.tick(max_fps)
 				for e in pg.event.get():
 					self.handle_event(e)
@@ -13,6 +13,7 @@ class TextLabel(gui.View):
 	def __init__(self, w, h, st = None):
 		gui.View.__init__(self, w, h)
 		self.style = style.bind(self, st)
+		self.opaque = bool(self.style.f_color)
 		self.font  = None
 		self.text  = None
 		self.color = None
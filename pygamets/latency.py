@@ -0,0 +1,67 @@
+"""
+Input to display latency statistics
+"""
+
+import logging
+
+class LatencyHistogram(object):
+	"""The histogram of latency values with 1 msec resolution"""
+	def __init__(self, max_msec = 1000):
+		self.max_msec = max_msec
+		self.reset()
+
+	def reset(self):
+		"""Clear collected statistics"""
+		# The last bucket collects all values exceeding max_msec
+		self.counts = [0] * (self.max_msec + 1)
+		self.count = 0
+		self.total = 0.
+		self.max = 0.
+
+	def add(self, secs):
+		"""Add latency value given in seconds"""
+		msec = max(0., secs * 1000.)
+		self.counts[min(self.max_msec, int(msec))] += 1
+		self.count += 1
+		self.total += msec
+		self.max = max(self.max, msec)
+
+	def percentile(self, p):
+		"""Returns the latency in msec not exceeded by p percents of samples or None if there are no samples"""
+		if not self.count:
+			return None
+		threshold = self.count * p / 100.
+		cnt = 0
+		for msec, n in enumerate(self.counts):
+			cnt += n
+			if cnt >= threshold:
+				return msec
+		return self.max_msec
+
+	def mean(self):
+		"""Returns the mean latency in msec or None if there are no samples"""
+		if not self.count:
+			return None
+		return self.total / self.count
+
+	def summary(self):
+		"""Returns the dictionary with samples count, mean, max and p50, p95, p99 percentiles in msec"""
+		return {
+			'count' : self.count,
+			'mean'  : self.mean(),
+			'max'   : self.max,
+			'p50'   : self.percentile(50),
+			'p95'   : self.percentile(95),
+			'p99'   : self.percentile(99),
+		}
+
+	def __str__(self):
+		if not self.count:
+			return 'latency: no samples'
+		return 'latency: count=%(count)d mean=%(mean).1f p50=%(p50)d p95=%(p95)d p99=%(p99)d max=%(max).1f msec' % self.summary()
+
+	def log(self, logger = None, level = logging.INFO):
+		"""Put statistics summary to the log"""
+		if logger is None:
+			logger = logging.getLogger('pygamets')
+		logger.log(level, str(self))
@@ -0,0 +1,151 @@
+"""
+Event loop phases profiler.
+
+The profiler measures the time spent by the event loop in the following phases:
+  run_callbacks, run_jobs, process_timers - the application background work
+  pygame_get_events, read_events          - pygame and touch screen input reading
+  handle_event                            - screen events handling
+  draw                                    - views drawing
+  refresh                                 - display update
+The phases may nest, for example the click handler showing the window draws
+views within handle_event, or Screen.refresh runs the background work limited
+by the frame budget and draws views. The time of the nested phase is accounted
+to that phase only and subtracted from the enclosing one so the phases timings
+may be summed up.
+The profiler replaces the corresponding routines by the measuring wrappers when
+enabled and restores original ones when disabled so it costs nothing while disabled.
+"""
+
+import time, logging
+from collections import deque
+import app, gui
+
+PHASES = (
+	'run_callbacks', 'run_jobs', 'process_timers',
+	'pygame_get_events', 'read_events',
+	'handle_event', 'draw', 'refresh'
+)
+
+clock = getattr(time, 'perf_counter', time.time)
+
+# Profiler instance
+instance = None
+
+def enable(screen, window = 100):
+	"""Start profiling event loop of the given screen, returns Profiler instance"""
+	global instance
+	if instance is None:
+		instance = Profiler(window)
+		instance.install(app.instance, screen)
+	return instance
+
+def disable():
+	"""Stop profiling"""
+	global instance
+	if instance is not None:
+		instance.uninstall()
+		instance = None
+
+class Profiler(object):
+	"""The event loop profiler collecting per-frame phase timings over the window of last frames"""
+	def __init__(self, window = 100):
+		self.window = window
+		self.frame = {}
+		self.history = {}
+		self.max = {}
+		self.reset()
+		self.patched = []
+		# The phases being measured, the innermost is the last one
+		self.stack = []
+
+	def reset(self):
+		"""Clear collected statistics"""
+		# The dictionaries are updated in place since the wrappers keep reference to them
+		self.frame.update(dict.fromkeys(PHASES, 0.))
+		self.history.update((p, deque(maxlen = self.window)) for p in PHASES)
+		self.max.update(dict.fromkeys(PHASES, 0.))
+		self.frames = 0
+
+	def install(self, app_inst, screen):
+		"""Replace phase routines by measuring wrappers"""
+		if app_inst is not None:
+			for name in ('run_callbacks', 'run_jobs', 'process_timers', 'pygame_get_events', 'read_events'):
+				self.patch(app_inst, name, self.wrap(name, getattr(app_inst, name)))
+		self.patch(screen, 'handle_event', self.wrap('handle_event', screen.handle_event))
+		self.patch(screen, 'update_display', self.wrap('refresh', screen.update_display))
+		self.patch(screen, 'refresh', self.wrap_frame(screen.refresh))
+		self.patch(screen, 'draw_dirty_areas', self.wrap('draw', screen.draw_dirty_areas))
+		self.patch(gui.View, 'redraw', self.wrap('draw', gui.View.__dict__['redraw']))
+
+	def uninstall(self):
+		"""Restore original routines"""
+		for obj, name, had, orig in reversed(self.patched):
+			if had:
+				setattr(obj, name, orig)
+			else:
+				delattr(obj, name)
+		self.patched = []
+
+	def patch(self, obj, name, fn):
+		had = name in obj.__dict__
+		self.patched.append((obj, name, had, obj.__dict__.get(name)))
+		setattr(obj, name, fn)
+
+	def wrap(self, phase, fn):
+		frame, stack = self.frame, self.stack
+		def wrapper(*args, **kwargs):
+			stack.append(phase)
+			start = clock()
+			try:
+				return fn(*args, **kwargs)
+			finally:
+				elapsed = clock() - start
+				stack.pop()
+				frame[phase] += elapsed
+				if stack:
+					# exclude the nested phase time from the enclosing one
+					frame[stack[-1]] -= elapsed
+		return wrapper
+
+	def wrap_frame(self, fn):
+		def refresh():
+			try:
+				return fn()
+			finally:
+				self.end_frame()
+		return refresh
+
+	def end_frame(self):
+		"""Complete frame statistics"""
+		for p in PHASES:
+			t = self.frame[p]
+			self.history[p].append(t)
+			if t > self.max[p]:
+				self.max[p] = t
+			self.frame[p] = 0.
+		self.frames += 1
+
+	def stats(self):
+		"""
+		Returns the dictionary mapping phase name to the (mean, window max, max)
+		per-frame timings tuple in msec. The mean and window max are calculated
+		over the last frames window while max is calculated since the last reset.
+		"""
+		res = {}
+		for p in PHASES:
+			h = self.history[p]
+			if h:
+				res[p] = 1000. * sum(h) / len(h), 1000. * max(h), 1000. * self.max[p]
+			else:
+				res[p] = 0., 0., 0.
+		return res
+
+	def __str__(self):
+		st = self.stats()
+		return 'frames=%d ' % self.frames + ' '.join('%s=%.2f/%.2f/%.2f' % ((p,) + st[p]) for p in PHASES) + ' msec'
+
+	def log(self, logger = None, level = logging.INFO):
+		"""Put per-frame timings (mean/window max/max) to the log"""
+		if logger is None:
+			logger = logging.getLogger('pygamets')
+		logger.log(level, str(self))
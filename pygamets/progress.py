@@ -35,7 +35,7 @@ class PieProgressIndicator(gui.View):
 	def init(self, surface):
 		gui.View.init(self, surface)
 		self.timer = app.Timer(self.on_timer, self.style.interval, True)
-		app.instance.add_timer(self.timer)
+		app.instance.animation.subscribe(self.timer)
 
 	def fini(self):
 		gui.View.fini(self)
@@ -80,6 +80,7 @@ class BallClockProgressIndicator(gui.View):
 	def __init__(self, w, st = None):
 		gui.View.__init__(self, w, w)
 		self.style = style.bind(self, st)
+		self.opaque = False
 		self.progress = 0.
 		self.rotating = False
 		self.phase = 0
@@ -98,7 +99,7 @@ class BallClockProgressIndicator(gui.View):
 	def init(self, surface):
 		gui.View.init(self, surface)
 		self.timer = app.Timer(self.on_timer, self.style.interval, True)
-		app.instance.add_timer(self.timer)
+		app.instance.animation.subscribe(self.timer)
 		cnt = self.style.ball_cnt
 		assert cnt > 1
 		d = 1 + 2*int(self.w*self.style.ball_sz/2)
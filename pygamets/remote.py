@@ -0,0 +1,272 @@
+"""
+GUI running in the separate render process.
+
+The screen and the views tree live in the render process while the
+application process talks to it by means of the pair of ring buffers
+in the shared memory. The commands channel carries compact commands
+addressed to the named views (set_text, set_progress, set_charge,
+set_data) while the signals channel returns the views signals such as
+Button.clicked. So the heavy computations in the application process
+do not affect the GUI responsiveness.
+"""
+
+import os, struct, mmap, time, logging
+import multiprocessing as mp
+from array import array
+import app, gui
+
+# Commands
+CMD_SET_TEXT     = 1
+CMD_SET_PROGRESS = 2
+CMD_SET_CHARGE   = 3
+CMD_SET_DATA     = 4
+CMD_QUIT         = 5
+
+# Signals
+SIG_CLICKED = 1
+SIG_EXIT    = 2
+
+# Ring buffer header: write and read positions
+_hdr = struct.Struct('QQ')
+_len = struct.Struct('I')
+
+class RingBuffer(object):
+	"""
+	Single producer single consumer ring buffer of variable length messages
+	in the anonymous shared memory. It must be created before forking the
+	process sharing it.
+	"""
+	def __init__(self, size = 0x10000):
+		self.size = size
+		self.mem = mmap.mmap(-1, _hdr.size + size)
+
+	def positions(self):
+		return _hdr.unpack_from(self.mem, 0)
+
+	def put(self, msg, timeout = None, alive = None):
+		"""
+		Put message to the buffer waiting for the free space if necessary.
+		Returns False if the timeout expired or the optional alive routine
+		reports the consumer has gone while waiting.
+		"""
+		n = _len.size + len(msg)
+		assert n <= self.size
+		deadline = None if timeout is None else time.time() + timeout
+		while True:
+			head, tail = self.positions()
+			if self.size - (head - tail) >= n:
+				break
+			if deadline is not None and time.time() >= deadline:
+				return False
+			if alive is not None and not alive():
+				return False
+			time.sleep(.001)
+		self._write(head, _len.pack(len(msg)) + msg)
+		# publish message by advancing write position
+		struct.pack_into('Q', self.mem, 0, head + n)
+		return True
+
+	def get(self):
+		"""Returns the next message or None if the buffer is empty"""
+		head, tail = self.positions()
+		if head == tail:
+			return None
+		n, = _len.unpack(self._read(tail, _len.size))
+		msg = self._read(tail + _len.size, n)
+		struct.pack_into('Q', self.mem, 8, tail + _len.size + n)
+		return msg
+
+	def _write(self, pos, data):
+		off, n = pos % self.size, len(data)
+		first = min(n, self.size - off)
+		base = _hdr.size
+		self.mem[base + off:base + off + first] = data[:first]
+		if first < n:
+			self.mem[base:base + n - first] = data[first:]
+
+	def _read(self, pos, n):
+		off = pos % self.size
+		first = min(n, self.size - off)
+		base = _hdr.size
+		data = self.mem[base + off:base + off + first]
+		if first < n:
+			data += self.mem[base:base + n - first]
+		return data
+
+def _to_bytes(a):
+	return a.tobytes() if hasattr(a, 'tobytes') else a.tostring()
+
+def _from_bytes(data):
+	a = array('d')
+	if hasattr(a, 'frombytes'):
+		a.frombytes(data)
+	else:
+		a.fromstring(data)
+	return a
+
+def _pack_name(name):
+	name = name.encode('utf-8')
+	return struct.pack('B', len(name)) + name
+
+def _unpack_name(msg, off):
+	n = struct.unpack_from('B', msg, off)[0]
+	off += 1
+	return msg[off:off + n].decode('utf-8'), off + n
+
+def encode(cmd, name, payload = b''):
+	"""Encode command or signal message"""
+	return struct.pack('B', cmd) + _pack_name(name) + payload
+
+def decode(msg):
+	"""Returns (cmd, name, payload) tuple"""
+	cmd = struct.unpack_from('B', msg, 0)[0]
+	name, off = _unpack_name(msg, 1)
+	return cmd, name, msg[off:]
+
+class Renderer(object):
+	"""
+	The render process side. The build routine is called in the render process
+	after application initialization. It should create the screen, show windows
+	and return the tuple (screen, views) where views is the dictionary mapping
+	names to the views controlled remotely. The event loop sleeps while idle
+	polling the commands buffer every poll_interval msec. The init_args are
+	passed to app.init (for example headless = True).
+	The commands addressed to the unknown views are ignored.
+	"""
+	def __init__(self, build, commands, signals, max_fps = 0, poll_interval = 10, init_args = None):
+		self.build = build
+		self.init_args = init_args or {}
+		self.commands = commands
+		self.signals = signals
+		self.max_fps = max_fps
+		self.poll_interval = poll_interval
+		self.views = None
+		self.parent_pid = os.getpid()
+
+	def run(self):
+		app.init(**self.init_args)
+		screen, self.views = self.build()
+		for name, v in self.views.items():
+			clicked = getattr(v, 'clicked', None)
+			if clicked is not None:
+				clicked.connect(self.clicked_cb(name))
+		app.instance.add_timer(app.Timer(self.poll, self.poll_interval, True))
+		try:
+			screen.run_event_loop(self.max_fps, idle = True)
+		finally:
+			self.signal(encode(SIG_EXIT, ''))
+			app.fini()
+
+	def parent_alive(self):
+		return os.getppid() == self.parent_pid
+
+	def signal(self, msg):
+		"""Send signal unless the application process has gone"""
+		self.signals.put(msg, alive = self.parent_alive)
+
+	def clicked_cb(self, name):
+		return lambda: self.signal(encode(SIG_CLICKED, name))
+
+	def poll(self):
+		"""Execute pending commands"""
+		while True:
+			msg = self.commands.get()
+			if msg is None:
+				break
+			cmd, name, payload = decode(msg)
+			if cmd == CMD_QUIT:
+				gui.quit()
+				continue
+			v = self.views.get(name)
+			if v is None:
+				logging.getLogger('pygamets').warning('remote command %d to unknown view %r', cmd, name)
+				continue
+			if cmd == CMD_SET_TEXT:
+				has_text, has_color = struct.unpack_from('BB', payload, 0)
+				color = struct.unpack_from('BBB', payload, 2) if has_color else None
+				text = payload[5:].decode('utf-8') if has_text else None
+				v.set_text(text, color)
+			elif cmd == CMD_SET_PROGRESS:
+				val, rotating = struct.unpack('dB', payload)
+				v.set_progress(val, bool(rotating))
+			elif cmd == CMD_SET_CHARGE:
+				v.set_charge(struct.unpack('d', payload)[0])
+			elif cmd == CMD_SET_DATA:
+				n = struct.unpack_from('I', payload, 0)[0]
+				if n == 0xffffffff:
+					v.set_data(None)
+				else:
+					data = payload[4:]
+					v.set_data((_from_bytes(data[:8*n]), _from_bytes(data[8*n:])))
+
+class RemoteGUI(object):
+	"""
+	The application process side. Starts the render process running
+	the GUI built by the build routine (see Renderer) and sends commands to it.
+	The signals returned by the render process are dispatched to the
+	connected callbacks by the poll routine. The keyword arguments are passed
+	to app.init in the render process, for example headless = True.
+	"""
+	def __init__(self, build, max_fps = 0, buffer_size = 0x40000, poll_interval = 10, **init_args):
+		self.commands = RingBuffer(buffer_size)
+		self.signals = RingBuffer(0x1000)
+		self.callbacks = {}
+		self.exited = False
+		ctx = mp.get_context('fork') if hasattr(mp, 'get_context') else mp
+		renderer = Renderer(build, self.commands, self.signals, max_fps, poll_interval, init_args)
+		self.process = ctx.Process(target = renderer.run, name = 'Renderer')
+		self.process.daemon = True
+		self.process.start()
+
+	def set_text(self, name, text, color = None):
+		payload = struct.pack('BB', text is not None, color is not None)
+		payload += struct.pack('BBB', *color) if color is not None else b'\0\0\0'
+		if text is not None:
+			payload += text.encode('utf-8')
+		self.send(encode(CMD_SET_TEXT, name, payload))
+
+	def set_progress(self, name, val, rotating = False):
+		self.send(encode(CMD_SET_PROGRESS, name, struct.pack('dB', val, rotating)))
+
+	def set_charge(self, name, val):
+		self.send(encode(CMD_SET_CHARGE, name, struct.pack('d', val)))
+
+	def set_data(self, name, xy):
+		"""Set plot data as (X, Y) tuple of numbers sequences or None"""
+		if xy is None:
+			payload = struct.pack('I', 0xffffffff)
+		else:
+			X, Y = xy
+			assert len(X) == len(Y)
+			payload = struct.pack('I', len(X)) + _to_bytes(array('d', X)) + _to_bytes(array('d', Y))
+		self.send(encode(CMD_SET_DATA, name, payload))
+
+	def send(self, msg):
+		"""Send command to the render process, raises RuntimeError if it has exited"""
+		if not self.process.is_alive() or not self.commands.put(msg, alive = self.process.is_alive):
+			raise RuntimeError('the render process has exited')
+
+	def quit(self):
+		"""Ask the render process to quit event loop"""
+		self.send(encode(CMD_QUIT, ''))
+
+	def connect(self, name, cb, sig = SIG_CLICKED):
+		"""Connect callback to the signal of the named view"""
+		self.callbacks.setdefault((sig, name), []).append(cb)
+
+	def poll(self):
+		"""Dispatch signals received from the render process. Returns False if it has exited."""
+		while True:
+			msg = self.signals.get()
+			if msg is None:
+				break
+			sig, name, _ = decode(msg)
+			if sig == SIG_EXIT:
+				self.exited = True
+			for cb in self.callbacks.get((sig, name), ()):
+				cb()
+		return not self.exited and self.process.is_alive()
+
+	def join(self, timeout = None):
+		"""Wait for the render process exit"""
+		self.process.join(timeout)
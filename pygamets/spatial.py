@@ -0,0 +1,79 @@
+"""
+Spatial index of interactive views for fast hit testing
+"""
+
+# The key suffix ordering the view after its descendants
+_LAST = float('inf')
+
+class GridIndex(object):
+	"""
+	The uniform grid of screen cells referencing the interactive views overlapping them.
+	Every view is stored with the priority key so that the view found matches the one
+	returned by View.find_interactive - the children are searched before the parent
+	and in the order of adding. The key is the path of child indexes from the window
+	root view followed by the largest value.
+	"""
+	def __init__(self, cell = 32):
+		self.cell = cell
+		self.cells = {}
+		# view -> (key, list of cells)
+		self.views = {}
+
+	def __len__(self):
+		return len(self.views)
+
+	def cells_of(self, (x, y, w, h)):
+		c = self.cell
+		return [
+			(cx, cy)
+			for cx in range(x // c, (x + w - 1) // c + 1)
+			for cy in range(y // c, (y + h - 1) // c + 1)
+		]
+
+	def insert(self, v, key):
+		"""Add view with the given priority key"""
+		self.remove(v)
+		cells = self.cells_of(v.frame())
+		entry = (key + (_LAST,), v)
+		for c in cells:
+			lst = self.cells.setdefault(c, [])
+			lst.append(entry)
+			lst.sort()
+		self.views[v] = entry[0], cells
+
+	def remove(self, v):
+		"""Remove view from the index"""
+		if v not in self.views:
+			return
+		key, cells = self.views.pop(v)
+		for c in cells:
+			lst = self.cells[c]
+			lst.remove((key, v))
+			if not lst:
+				del self.cells[c]
+
+	def move(self, v):
+		"""Update view position"""
+		if v in self.views:
+			key, _ = self.views[v]
+			self.insert(v, key[:-1])
+
+	def add_tree(self, v, key):
+		"""Add interactive views of the subtree with the root view having the given key"""
+		if v.interactive:
+			self.insert(v, key)
+		for i, c in enumerate(v.children):
+			self.add_tree(c, key + (i,))
+
+	def find(self, pos):
+		"""Find interactive view at given screen position"""
+		x, y = pos
+		c = self.cell
+		for _, v in self.cells.get((x // c, y // c), ()):
+			if v.cover_screen_pos(pos):
+				return v
+		return None
+
+	def clear(self):
+		self.cells.clear()
+		self.views.clear()
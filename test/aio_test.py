@@ -0,0 +1,78 @@
+#!/usr/bin/python
+
+"""
+Asyncio integration test.
+Runs the headless screen event loop on the asyncio event loop with
+the timer added before the start, the periodic timer, the job added
+from the foreign thread and the coroutine closing the window. Then checks
+the pending timers are handed back to the application timer queue and
+the exception raised by the job is delivered by the run future.
+"""
+
+import sys, threading
+sys.path.append('..')
+import pygame as pg
+from pygamets import app, gui, label, utils, aio
+from pygamets.aio import asyncio
+from pygamets.frame import Frame
+from pygamets.style import Style
+
+done = []
+
+def build(screen):
+	w = gui.Window(0, 0, Frame(320, 240, Style(border=0, f_color=(0, 0, 100))))
+	lbl = label.TextLabel(200, 50, Style(f_color=(0, 0, 100), t_color=(255, 255, 0), font_face='freesans', font_size=24))
+	utils.add_top_left(w, lbl)
+	screen.show(w)
+	return w, lbl
+
+@asyncio.coroutine
+def close_later(w):
+	yield asyncio.From(asyncio.sleep(.3))
+	done.append('coroutine')
+	w.close()
+
+def foreign_job():
+	done.append('job')
+
+def failing_job():
+	raise RuntimeError('job failed')
+
+if __name__ == '__main__':
+	inst = app.init(headless = True)
+	screen = gui.Screen()
+	screen.init_mode((320, 240))
+	w, lbl = build(screen)
+	loop = asyncio.get_event_loop()
+
+	# The timer scheduled before the start is handed over to the asyncio loop
+	inst.add_timer(app.Timer(lambda: (done.append('timer'), lbl.set_text('timer')), 50, False))
+	ticks = []
+	periodic = app.Timer(lambda: ticks.append(pg.time.get_ticks()), 60, True)
+	inst.add_timer(periodic)
+	# The long timer is pending on exit so it must be handed back
+	pending = app.Timer(lambda: done.append('pending'), 60000, False)
+	inst.add_timer(pending)
+
+	threading.Timer(.1, inst.add_job, (foreign_job,)).start()
+	aio.spawn(close_later(w), loop)
+	aio.run_event_loop(screen, loop = loop)
+
+	print 'done:', done, 'periodic ticks:', len(ticks)
+	assert done == ['timer', 'job', 'coroutine']
+	assert len(ticks) >= 3
+	assert isinstance(inst.timers, app.TimerQueue)
+	assert pending.queue is inst.timers and periodic.queue is inst.timers
+	assert len(inst.timers) == 2
+
+	# The exception raised in the event loop context completes the run future
+	w, lbl = build(screen)
+	inst.add_job(failing_job)
+	try:
+		aio.run_event_loop(screen, loop = loop)
+		assert False, 'the exception is not delivered'
+	except RuntimeError as e:
+		print 'exception delivered:', e
+	assert isinstance(inst.timers, app.TimerQueue)
+	assert len(inst.timers) == 2
+	app.fini()
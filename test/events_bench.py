@@ -0,0 +1,73 @@
+#!/usr/bin/python
+
+"""
+Raw events decoding benchmark.
+Generates the file with synthetic touch records and measures
+the number of records decoded per millisecond.
+"""
+
+import sys, os, time, struct, tempfile
+sys.path.append('..')
+from pygamets import events
+
+N = 100000
+
+def make_records(n):
+	"""Generate n records imitating finger drag"""
+	recs = []
+	for i in range(n // 3):
+		recs.append(struct.pack(events.EV_FMT, i, events.EV_ABS, events.ABS_X, 1000 + i % 2000))
+		recs.append(struct.pack(events.EV_FMT, i, events.EV_ABS, events.ABS_Y, 3000 - i % 2000))
+		recs.append(struct.pack(events.EV_FMT, i, 0, 0, 0))
+	return b''.join(recs)
+
+def bench_legacy(path):
+	"""The baseline read_events loop: one read, one unpack and one Event per record"""
+	f = os.fdopen(os.open(path, os.O_RDONLY|os.O_NONBLOCK), 'r')
+	evs = []
+	pos_x, pos_y = None, None
+	while True:
+		e = f.read(events.EV_SZ)
+		if len(e) < events.EV_SZ:
+			break
+		ts, type, code, val = struct.unpack(events.EV_FMT, e)
+		if type == events.EV_KEY:
+			evs.append(events.Event(val != 0, None, events.ev_time(ts)))
+		elif type == events.EV_ABS:
+			if code == events.ABS_X:
+				pos_x = val
+			if code == events.ABS_Y:
+				pos_y = val
+			if pos_x is not None and pos_y is not None:
+				evs.append(events.Event(None, (pos_x, pos_y), events.ev_time(ts)))
+				pos_x, pos_y = None, None
+	f.close()
+	return len(evs)
+
+def bench_bulk(path):
+	"""Bulk reading and decoding"""
+	events.events_filename = path
+	events.events_file = None
+	cnt = len(events.read_events())
+	events.events_file.close()
+	events.events_file = None
+	return cnt
+
+def run(name, fn, path, n):
+	start = time.time()
+	cnt = fn(path)
+	elapsed = (time.time() - start) * 1000
+	print '%s: %d records (%d events) in %.1f msec, %.1f records per msec' % (name, n, cnt, elapsed, n / elapsed)
+	return cnt
+
+data = make_records(N)
+fd, path = tempfile.mkstemp()
+try:
+	os.write(fd, data)
+	os.close(fd)
+	n = len(data) // events.EV_SZ
+	legacy = run('legacy', bench_legacy, path, n)
+	bulk = run('bulk', bench_bulk, path, n)
+	assert legacy == bulk
+finally:
+	os.remove(path)
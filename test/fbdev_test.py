@@ -0,0 +1,67 @@
+#!/usr/bin/python
+
+"""
+Framebuffer backend test.
+Renders the headless screen into the temporary regular file standing
+in place of the framebuffer device for 16 and 32 bpp formats. Checks
+the pixel values written and that only the updated rectangles are copied.
+"""
+
+import sys, os, struct, tempfile
+sys.path.append('..')
+from pygamets import app, gui, fbdev
+from pygamets.frame import Frame
+from pygamets.style import Style
+
+W, H = 320, 240
+BLUE, GREEN, RED = (0, 0, 255), (0, 255, 0), (255, 0, 0)
+PIXELS = {
+	16: {BLUE: 0x001f, GREEN: 0x07e0, RED: 0xf800},
+	32: {BLUE: 0x0000ff, GREEN: 0x00ff00, RED: 0xff0000},
+}
+
+def pixel(data, bpp, x, y):
+	n = bpp // 8
+	return struct.unpack_from('<H' if n == 2 else '<I', data, (y * W + x) * n)[0]
+
+def read(path):
+	with open(path, 'rb') as f:
+		return f.read()
+
+def test(bpp):
+	fd, path = tempfile.mkstemp()
+	os.close(fd)
+	fb = fbdev.Framebuffer(path, bpp = bpp)
+	screen = gui.Screen()
+	screen.init_mode((W, H), backend = fb)
+	try:
+		w = gui.Window(0, 0, Frame(W, H, Style(border=2, f_color=BLUE, b_color=RED)))
+		box = Frame(40, 30, Style(border=0, f_color=GREEN))
+		w.add_child(box, 100, 100)
+		screen.show(w)
+		screen.refresh()
+		data, px = read(path), PIXELS[bpp]
+		assert len(data) == W * H * bpp // 8
+		assert pixel(data, bpp, 1, 1) == px[RED]
+		assert pixel(data, bpp, 50, 50) == px[BLUE]
+		assert pixel(data, bpp, 110, 110) == px[GREEN]
+
+		# Fill the framebuffer with the pattern and update the box only
+		fb.mem[:] = b'\xaa' * len(fb.mem)
+		box.update()
+		screen.refresh()
+		data, pattern = read(path), int('aa' * (bpp // 8), 16)
+		for x, y in ((100, 100), (139, 129), (120, 115)):
+			assert pixel(data, bpp, x, y) == px[GREEN], (x, y)
+		for x, y in ((99, 100), (140, 100), (100, 99), (100, 130), (0, 0), (W - 1, H - 1)):
+			assert pixel(data, bpp, x, y) == pattern, (x, y)
+		print '%d bpp ok' % bpp
+	finally:
+		fb.close()
+		os.remove(path)
+
+if __name__ == '__main__':
+	app.init(headless = True)
+	for bpp in (16, 32):
+		test(bpp)
+	app.fini()
@@ -0,0 +1,43 @@
+#!/usr/bin/python
+
+"""
+Events reader thread test.
+The FIFO stands in place of the touch screen device.
+The test writes synthetic touch records into it
+and prints events received by the reader thread,
+then checks the reader is stopped.
+"""
+
+import sys, os, time, struct, tempfile, threading
+sys.path.append('..')
+from pygamets import events
+
+def record(type, code, val):
+	return struct.pack(events.EV_FMT, 0, type, code, val)
+
+def touch(x, y):
+	return record(events.EV_KEY, 0, 1) + \
+		record(events.EV_ABS, events.ABS_X, x) + record(events.EV_ABS, events.ABS_Y, y) + \
+		record(events.EV_KEY, 0, 0)
+
+path = os.path.join(tempfile.mkdtemp(), 'event0')
+os.mkfifo(path)
+
+woken = threading.Event()
+reader = events.EventsReader(woken.set, path)
+reader.start()
+
+with open(path, 'wb', 0) as f:
+	for i in range(5):
+		f.write(touch(100 + i, 200 + i))
+		woken.wait(1)
+		woken.clear()
+		time.sleep(.01)
+		for e in reader.read_events():
+			print e
+
+reader.stop()
+assert not reader.is_alive()
+
+os.remove(path)
+os.rmdir(os.path.dirname(path))
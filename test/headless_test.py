@@ -0,0 +1,44 @@
+#!/usr/bin/python
+
+"""
+Headless mode test.
+Runs the GUI without display and touch screen, saves the screen
+and the button snapshots and closes the window by the injected tap.
+"""
+
+import sys, os, tempfile
+sys.path.append('..')
+import pygame as pg
+from pygamets import app, gui, button, label, utils
+from pygamets.frame import Frame
+from pygamets.style import Style
+
+if __name__ == '__main__':
+	app.init(headless = True)
+	screen = gui.Screen()
+	screen.init_mode((320, 240))
+	w = gui.Window(0, 0, Frame(320, 240, Style(border=0, f_color=(0, 0, 100))))
+	btn = button.RectButton(100, 50, Style(name='Quit', border=0, f_color=(0, 0, 200), p_color=(0, 0, 255), t_color=(255, 255, 255), font_face='freesans', font_size=24))
+	btn.clicked.connect(w.close)
+	utils.add_top_right(w, btn)
+	lbl = label.TextLabel(200, 50, Style(f_color=(0, 0, 100), t_color=(255, 255, 0), font_face='freesans', font_size=24))
+	utils.add_top_left(w, lbl)
+	screen.show(w)
+	lbl.set_text('Headless')
+	screen.refresh()
+
+	tmp = tempfile.mkdtemp()
+	screen_png, btn_png = os.path.join(tmp, 'screen.png'), os.path.join(tmp, 'button.png')
+	screen.save_png(screen_png)
+	screen.save_png(btn_png, btn)
+	img = pg.image.load(btn_png)
+	assert img.get_size() == (btn.w, btn.h)
+	x, y, _, _ = btn.frame()
+	assert img.get_at((btn.w // 2, 2)) == screen.surface.get_at((x + btn.w // 2, y + 2))
+	assert pg.image.load(screen_png).get_size() == (320, 240)
+
+	app.instance.inject_tap((x + btn.w // 2, y + btn.h // 2))
+	screen.run_event_loop(idle = True)
+	assert screen.top_window() is None
+	print 'snapshots saved to', tmp
+	app.fini()
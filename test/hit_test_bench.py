@@ -0,0 +1,58 @@
+#!/usr/bin/python
+
+"""
+Touch hit testing benchmark.
+Compares the window spatial index against the recursive View.find_interactive
+on the dense keypad like layouts checking both return the same views.
+"""
+
+import sys, time, random
+sys.path.append('..')
+import pygame as pg
+from pygamets import gui
+
+W, H = 800, 480
+N = 20000
+
+class Screen(object):
+	"""The screen stub providing the surface for views initialization"""
+	def __init__(self):
+		self.surface = pg.Surface((W, H))
+
+def keypad(cols, rows, nested):
+	"""Build the window with cols x rows grid of interactive views"""
+	root = gui.View(W, H)
+	w, h = W // cols, H // rows
+	for r in range(rows):
+		parent = root
+		if nested:
+			parent = gui.View(W, h)
+			root.add_child(parent, 0, r * h)
+		for c in range(cols):
+			btn = gui.View(w - 2, h - 2)
+			btn.interactive = True
+			parent.add_child(btn, c * w + 1, 1 if nested else r * h + 1)
+	wnd = gui.Window(0, 0, root)
+	wnd.init(Screen())
+	return wnd
+
+def bench(wnd, points):
+	t = time.time()
+	slow = [wnd.view.find_interactive(pos) for pos in points]
+	t_slow = time.time() - t
+	t = time.time()
+	fast = [wnd.find_interactive(pos) for pos in points]
+	t_fast = time.time() - t
+	assert slow == fast
+	return t_slow, t_fast
+
+if __name__ == '__main__':
+	random.seed(1)
+	points = [(random.randrange(W), random.randrange(H)) for _ in range(N)]
+	for cols, rows, nested in ((4, 4, False), (10, 10, False), (20, 12, False), (20, 12, True)):
+		wnd = keypad(cols, rows, nested)
+		t_slow, t_fast = bench(wnd, points)
+		print '%3d views%s: recursive %.2f usec, index %.2f usec per hit test, %.1fx' % (
+			cols * rows, ' (nested)' if nested else '         ',
+			t_slow * 1e6 / N, t_fast * 1e6 / N, t_slow / t_fast
+		)
@@ -0,0 +1,46 @@
+#!/usr/bin/python
+
+"""
+Keyed bounded job queue test.
+The event loop thread overfills the queue limited to 2 jobs, then 2 foreign
+threads add jobs with the same key. Both must block, the queue depth must match
+the number of live jobs and only the newest keyed job must be executed.
+"""
+
+import sys, time, threading
+sys.path.append('..')
+from pygamets import app
+
+def live_jobs(inst):
+	return sum(1 for _, job in inst.job_list if job is not None)
+
+if __name__ == '__main__':
+	inst = app.init(headless = True)
+	inst.set_job_limit(2, app.JOB_BLOCK)
+	done = []
+	# The event loop thread is never blocked
+	inst.add_job(lambda: done.append('a0'), 'a')
+	inst.add_job(lambda: done.append('x'))
+	inst.add_job(lambda: done.append('y'))
+	assert inst.job_queue_depth() == live_jobs(inst) == 3
+
+	producers = []
+	for name in ('a1', 'a2'):
+		t = threading.Thread(target = inst.add_job, args = ((lambda n = name: done.append(n)), 'a'))
+		t.daemon = True
+		t.start()
+		producers.append(t)
+		time.sleep(.1)
+		assert t.is_alive(), 'the producer is not blocked'
+		assert inst.job_queue_depth() == live_jobs(inst) == 2
+
+	inst.run_jobs()
+	for t in producers:
+		t.join(1)
+		assert not t.is_alive()
+	assert inst.job_queue_depth() == live_jobs(inst) == 1
+	inst.run_jobs()
+	print 'executed:', done, 'stats:', inst.job_queue_stats()
+	assert done[:2] == ['x', 'y'] and len(done) == 3 and done[2] in ('a1', 'a2')
+	assert inst.job_queue_depth() == 0
+	app.fini()
@@ -0,0 +1,58 @@
+#!/usr/bin/python
+
+"""
+Test for the GUI running in the separate render process.
+The application process keeps CPU busy while updating
+the progress indicator and label in the render process.
+Quits the render process after ITERATIONS updates or on Quit button tap.
+Run with the --headless option to test without display and touch screen.
+"""
+
+import sys, time
+sys.path.append('..')
+from pygamets import env
+from pygamets import gui, button, label, progress, utils, remote
+from pygamets.frame import Frame
+from pygamets.style import Style
+
+def build():
+	"""Called in the render process"""
+	screen = gui.Screen()
+	screen.init_mode((320, 240))
+	w = gui.Window(0, 0, Frame(320, 240, Style(border=0, f_color=(0, 0, 100))))
+	btn = button.RectButton(100, 50, Style(name='Quit', border=0, f_color=(0, 0, 200), p_color=(0, 0, 255), t_color=(255, 255, 255), font_face='freesans', font_size=24))
+	utils.add_top_right(w, btn)
+	lbl = label.TextLabel(200, 50, Style(f_color=(0, 0, 100), t_color=(255, 255, 0), font_face='freesans', font_size=24))
+	utils.add_top_left(w, lbl)
+	ind = progress.PieProgressIndicator(150, Style(interval=50, period=36, f_color=(0, 0, 100), done_color=(0, 255, 0), todo_color=(100, 100, 100)))
+	utils.add_left_bottom(w, ind)
+	screen.show(w)
+	return screen, {'quit': btn, 'label': lbl, 'progress': ind}
+
+ITERATIONS = 100
+
+def busy(secs):
+	end = time.time() + secs
+	while time.time() < end:
+		pass
+
+rgui = remote.RemoteGUI(build, max_fps = 30, headless = '--headless' in sys.argv)
+rgui.connect('quit', rgui.quit)
+# The command to the unknown view must not break the render process
+rgui.set_text('missing', 'ignored')
+i = 0
+while rgui.poll():
+	busy(.05)
+	i += 1
+	if i == ITERATIONS:
+		rgui.quit()
+		break
+	rgui.set_text('label', str(i))
+	rgui.set_progress('progress', (i % 100) / 100.)
+rgui.join(5)
+assert not rgui.process.is_alive()
+try:
+	rgui.set_text('label', 'gone')
+	assert False, 'the exited render process is not detected'
+except RuntimeError as e:
+	print 'done after %d iterations:' % i, e
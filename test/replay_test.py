@@ -0,0 +1,55 @@
+#!/usr/bin/python
+
+"""
+Headless events trace replay test.
+Writes the trace with the taps on 2 buttons and the tap outside of them,
+replays it by the headless screen event loop and checks the clicks received.
+The raw coordinates are used as the screen ones in lack of calibration.
+"""
+
+import sys, os, struct, tempfile
+sys.path.append('..')
+from pygamets import app, gui, button, utils, events
+from pygamets.frame import Frame
+from pygamets.style import Style
+
+def record(t, type, code, val):
+	sec = int(t)
+	return struct.pack(events.EV_FMT, sec | int((t - sec) * 1e6) << 32, type, code, val)
+
+def tap(t, x, y):
+	return record(t, events.EV_KEY, 330, 1) + \
+		record(t, events.EV_ABS, events.ABS_X, x) + record(t, events.EV_ABS, events.ABS_Y, y) + \
+		record(t + .05, events.EV_KEY, 330, 0)
+
+def make_button(name):
+	return button.RectButton(100, 50, Style(name=name, border=0, f_color=(0, 0, 200), p_color=(0, 0, 255), t_color=(255, 255, 255), font_face='freesans', font_size=24))
+
+if __name__ == '__main__':
+	fd, path = tempfile.mkstemp()
+	os.write(fd, events.TRACE_MAGIC + tap(1000.1, 50, 200) + tap(1000.3, 20, 20) + tap(1000.5, 270, 20))
+	os.close(fd)
+
+	inst = app.init(headless = True)
+	# Map raw coordinates to the screen ones regardless of the calibration file
+	inst.calib = None
+	events.replay(path, realtime = False)
+	screen = gui.Screen()
+	screen.init_mode((320, 240))
+	w = gui.Window(0, 0, Frame(320, 240, Style(border=0, f_color=(0, 0, 100))))
+	clicks = []
+	btn1, btn2 = make_button('One'), make_button('Two')
+	btn1.clicked.connect(lambda: clicks.append('one'))
+	btn2.clicked.connect(lambda: (clicks.append('two'), w.close()))
+	utils.add_top_left(w, btn1)
+	utils.add_top_right(w, btn2)
+	screen.show(w)
+	# Give up if the replay does not close the window
+	inst.add_timer(app.Timer(gui.quit, 5000, False))
+	screen.run_event_loop(idle = True)
+
+	print 'clicks:', clicks
+	assert clicks == ['one', 'two']
+	assert events.events_file.finished()
+	app.fini()
+	os.remove(path)
@@ -0,0 +1,55 @@
+#!/usr/bin/python
+
+"""
+Timers scheduling benchmark.
+Compares the timer queue against the sorted list of timers
+with thousands of timers being added, cancelled and expired.
+"""
+
+import sys, time, random
+sys.path.append('..')
+from pygamets import app
+
+N = 5000
+
+class SortedList(object):
+	"""The sorted list of (due, timer) tuples with lazy cancellation"""
+	def __init__(self):
+		self.timers = []
+
+	def push(self, timer, due):
+		self.timers.append((due, timer))
+		self.timers.sort()
+
+	def pop_expired(self, now):
+		not_expired = len(self.timers)
+		for i, (t, _) in enumerate(self.timers):
+			if t > now:
+				not_expired = i
+				break
+		expired, self.timers = self.timers[:not_expired], self.timers[not_expired:]
+		return [timer for _, timer in expired if timer.cb]
+
+def nop():
+	pass
+
+def bench(name, q):
+	random.seed(0)
+	timers = [app.Timer(nop, random.randrange(10000), False) for _ in range(N)]
+	start = time.time()
+	for t in timers:
+		q.push(t, t.interval)
+	added = time.time()
+	for t in timers[::2]:
+		t.cancel()
+	cancelled = time.time()
+	fired = 0
+	for now in range(0, 10000, 10):
+		fired += len(q.pop_expired(now))
+	done = time.time()
+	print '%s: add %.1f msec, cancel %.1f msec, expire %.1f msec, %d fired' % (
+			name, (added - start) * 1000, (cancelled - added) * 1000, (done - cancelled) * 1000, fired
+		)
+
+bench('sorted list', SortedList())
+bench('timer queue', app.TimerQueue())
@@ -3,6 +3,8 @@
 """
 The touch screen calibration tool.
 Don't forget to run it under root user.
+Use -b option to build bilinear calibration
+with more points collected near the screen edges.
 """
 
 import sys, os, time
@@ -52,15 +54,18 @@ def get_calib_point(s, (x, y)):
 	draw_xmark(s, (0, 0, 0), xp, yp)
 	return tx, ty
 
-def calibrate():
+def calibrate(bilinear = False):
 	pg.display.init()
 	pg.mouse.set_visible(False)
 	pg.display.set_mode()
 	s = pg.display.set_mode()
-	screen_pts = [(.2, .2), (.8, .2), (.2, .8), (.8, .8), (.5, .5)]
+	if bilinear:
+		screen_pts = [(x, y) for y in (.1, .5, .9) for x in (.1, .5, .9)]
+	else:
+		screen_pts = [(.2, .2), (.8, .2), (.2, .8), (.8, .8), (.5, .5)]
 	while True:
 		touch_pts = [get_calib_point(s, pt) for pt in screen_pts]
-		calib, dmax = calibration.build(screen_pts, touch_pts)
+		calib, dmax = calibration.build(screen_pts, touch_pts, bilinear)
 		print 'max deviation %.1g' % dmax
 		if dmax > .02:
 			print 'bad accuracy, please try again'
@@ -71,7 +76,7 @@ def calibrate():
 
 
 if __name__=='__main__':
-	calibrate()
+	calibrate('-b' in sys.argv[1:])
 
 
 	
@@ -0,0 +1,32 @@
+#!/usr/bin/python
+
+"""
+The touch screen events recording tool.
+Records raw touch screen events to the trace file
+given in the command line until interrupted by Ctrl-C.
+The trace may be replayed later by means of events.replay().
+Don't forget to run it under root user.
+"""
+
+import sys, time
+
+sys.path.append('..')
+from pygamets import events
+
+def record(filename):
+	events.start_recording(filename)
+	cnt = 0
+	try:
+		while True:
+			cnt += len(events.read_events())
+			time.sleep(.01)
+	except KeyboardInterrupt:
+		pass
+	events.stop_recording()
+	print cnt, 'events recorded to', filename
+
+if __name__=='__main__':
+	if len(sys.argv) != 2:
+		print 'usage:', sys.argv[0], 'trace_file'
+		sys.exit(1)
+	record(sys.argv[1])